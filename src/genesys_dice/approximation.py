@@ -0,0 +1,308 @@
+"""
+Approximate odds for huge pools, in time that doesn't grow with the
+number of dice.
+
+Each die type's face table is reduced to its cumulant generating
+function, and a pool's is the count-weighted sum of its die types'.  The
+chance that a net symbol is at most some value is then approximated
+either by a normal distribution or by the Lugannani-Rice saddlepoint
+formula, both with a continuity correction for the integer-valued sums.
+
+Every answer carries an error bound.  The normal approximation is within
+the Berry-Esseen bound, which holds at every point of the CDF and so at
+the continuity-corrected one too; the saddlepoint approximation is within
+that bound plus its distance from the normal approximation.
+"""
+
+import math
+from statistics import NormalDist
+from typing import Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from genesys_dice.dice import Dice
+from genesys_dice.moments import QUANTITIES, die_moments
+
+APPROXIMATION_METHODS = ["normal", "saddlepoint"]
+
+METHODS = ["auto", "exact", *APPROXIMATION_METHODS]
+"""
+auto is exact up to APPROXIMATION_THRESHOLD symbol dice and saddlepoint
+above it.
+"""
+
+APPROXIMATION_QUANTITIES = ["success", "advantage", "triumph", "despair"]
+"""
+Net symbols that can be approximated, in the order of a die's nets.
+"""
+
+APPROXIMATION_THRESHOLD = 100
+"""
+Pools with more symbol dice than this are approximated by default.
+"""
+
+BERRY_ESSEEN_CONSTANT = 0.56
+"""
+Shevtsova's constant for sums of independent, not identically distributed
+variables.
+"""
+
+SADDLEPOINT_TOLERANCE = 1e-10
+
+STANDARD_NORMAL = NormalDist()
+
+
+class Approximation(NamedTuple):
+    probability: float
+    error_bound: float
+    method: str
+
+    def __str__(self) -> str:
+        return (
+            f"{round(self.probability * 100, 2)}% "
+            f"(± {round(self.error_bound * 100, 2)}%, {self.method})"
+        )
+
+
+class DieCumulants(NamedTuple):
+    """
+    A die's face values for one net symbol, their mean and variance, and
+    E|X - mean|^3 for the Berry-Esseen bound.
+    """
+
+    values: np.ndarray
+    mean: float
+    variance: float
+    absolute_third: float
+
+
+def die_cumulants(die_type: Dice, quantity: str) -> DieCumulants:
+    """
+    The mean and variance are the die's cached moments (see die_moments).
+    """
+    column = APPROXIMATION_QUANTITIES.index(quantity)
+    moments = die_moments(die_type)[QUANTITIES.index(quantity)]
+    values = np.array([nets[column] for nets in die_type.die.nets], dtype=float)
+
+    return DieCumulants(
+        values,
+        moments.mean,
+        moments.variance,
+        float((np.abs(values - moments.mean) ** 3).mean()),
+    )
+
+
+class PoolCumulants:
+    """
+    The cumulant generating function of one net symbol of a pool, and its
+    first two derivatives, as count-weighted sums over the die types.
+    """
+
+    def __init__(self, dice_counts: Mapping[Dice, int], quantity: str) -> None:
+        if quantity not in APPROXIMATION_QUANTITIES:
+            raise Exception(
+                f"Can't approximate {quantity}, expected one of"
+                f" {APPROXIMATION_QUANTITIES}"
+            )
+
+        self.dice: List[Tuple[int, DieCumulants]] = [
+            (count, die_cumulants(die_type, quantity))
+            for die_type, count in dice_counts.items()
+            if count > 0 and die_type is not Dice.PERCENTILE
+        ]
+        self.mean = sum(count * die.mean for count, die in self.dice)
+        self.variance = sum(count * die.variance for count, die in self.dice)
+        self.low = sum(count * float(die.values.min()) for count, die in self.dice)
+        self.high = sum(count * float(die.values.max()) for count, die in self.dice)
+
+    def berry_esseen_bound(self) -> float:
+        third = sum(count * die.absolute_third for count, die in self.dice)
+        return min(BERRY_ESSEEN_CONSTANT * third / math.pow(self.variance, 1.5), 1.0)
+
+    def cgf(self, s: float) -> Tuple[float, float, float]:
+        """
+        K(s), K'(s) and K''(s).
+        """
+        k = k1 = k2 = 0.0
+
+        for count, die in self.dice:
+            exponents = s * die.values
+            shift = exponents.max()
+            weights = np.exp(exponents - shift)
+            total = weights.sum()
+            mean = float((weights * die.values).sum() / total)
+            square = float((weights * die.values**2).sum() / total)
+            k += count * (shift + math.log(total / len(die.values)))
+            k1 += count * mean
+            k2 += count * (square - mean**2)
+
+        return k, k1, k2
+
+    def saddlepoint(self, x: float) -> float:
+        """
+        The s where K'(s) = x, for x strictly between low and high.
+        Newton's method, falling back to bisection within a bracket.
+        """
+        low, high = -1.0, 1.0
+        while self.cgf(low)[1] > x:
+            low *= 2
+        while self.cgf(high)[1] < x:
+            high *= 2
+
+        s = 0.0
+        for _ in range(200):
+            _, k1, k2 = self.cgf(s)
+            if abs(k1 - x) < SADDLEPOINT_TOLERANCE:
+                break
+            if k1 < x:
+                low = s
+            else:
+                high = s
+            step = s - (k1 - x) / k2 if k2 > 0 else math.nan
+            s = step if low < step < high else (low + high) / 2
+
+        return s
+
+
+def normal_cdf(cumulants: PoolCumulants, value: int) -> float:
+    deviation = math.sqrt(cumulants.variance)
+    return STANDARD_NORMAL.cdf((value + 0.5 - cumulants.mean) / deviation)
+
+
+def saddlepoint_cdf(cumulants: PoolCumulants, value: int) -> Optional[float]:
+    """
+    Lugannani-Rice, or None too close to the mean for it to be stable.
+    """
+    x = value + 0.5
+    s = cumulants.saddlepoint(x)
+    if abs(s) < 1e-6:
+        return None
+
+    k, _, k2 = cumulants.cgf(s)
+    w = math.copysign(math.sqrt(max(2 * (s * x - k), 0.0)), s)
+    u = 2 * math.sinh(s / 2) * math.sqrt(k2)
+    if w == 0:
+        return None
+
+    return STANDARD_NORMAL.cdf(w) + STANDARD_NORMAL.pdf(w) * (1 / w - 1 / u)
+
+
+def approximate_cdf(
+    dice_counts: Mapping[Dice, int],
+    value: int,
+    quantity: str = "success",
+    method: str = "saddlepoint",
+) -> Approximation:
+    """
+    P(quantity <= value).
+    """
+    if method not in APPROXIMATION_METHODS:
+        raise Exception(
+            f"Unknown method {method}, expected one of {APPROXIMATION_METHODS}"
+        )
+
+    return _approximate_cdf(PoolCumulants(dice_counts, quantity), value, method)
+
+
+def _approximate_cdf(
+    cumulants: PoolCumulants, value: int, method: str
+) -> Approximation:
+    # Outside the support, and for pools that can only roll one value,
+    # the answer is exact
+    if value < cumulants.low:
+        return Approximation(0.0, 0.0, method)
+    if value >= cumulants.high:
+        return Approximation(1.0, 0.0, method)
+
+    normal = normal_cdf(cumulants, value)
+    bound = cumulants.berry_esseen_bound()
+
+    if method == "normal":
+        return Approximation(normal, bound, method)
+
+    saddlepoint = saddlepoint_cdf(cumulants, value)
+    if saddlepoint is None:
+        return Approximation(normal, bound, method)
+
+    probability = min(max(saddlepoint, 0.0), 1.0)
+    return Approximation(
+        probability, min(bound + abs(probability - normal), 1.0), method
+    )
+
+
+def error_bound(
+    dice_counts: Mapping[Dice, int], value: int = 0, quantity: str = "success"
+) -> float:
+    """
+    The normal approximation's error bound for P(quantity <= value), from
+    the dice's cumulants alone.  The saddlepoint's is at least this.
+    """
+    cumulants = PoolCumulants(dice_counts, quantity)
+    if value < cumulants.low or value >= cumulants.high:
+        return 0.0
+
+    return cumulants.berry_esseen_bound()
+
+
+def approximate_success(
+    dice_counts: Mapping[Dice, int], method: str = "saddlepoint"
+) -> Approximation:
+    """
+    The chance of at least one net success.
+    """
+    below = approximate_cdf(dice_counts, 0, "success", method)
+    return Approximation(1 - below.probability, below.error_bound, method)
+
+
+def approximate_cdf_table(
+    dice_counts: Mapping[Dice, int],
+    quantity: str = "success",
+    method: str = "saddlepoint",
+    deviations: float = 6.0,
+) -> Dict[int, Approximation]:
+    """
+    P(quantity <= value) for each value within that many standard
+    deviations of the mean.
+    """
+    if method not in APPROXIMATION_METHODS:
+        raise Exception(
+            f"Unknown method {method}, expected one of {APPROXIMATION_METHODS}"
+        )
+
+    cumulants = PoolCumulants(dice_counts, quantity)
+    spread = deviations * math.sqrt(cumulants.variance)
+    low = max(math.floor(cumulants.mean - spread), int(cumulants.low))
+    high = min(math.ceil(cumulants.mean + spread), int(cumulants.high))
+
+    return {
+        value: _approximate_cdf(cumulants, value, method)
+        for value in range(low, high + 1)
+    }
+
+
+def symbol_dice_count(dice_counts: Mapping[Dice, int]) -> int:
+    return sum(
+        count
+        for die_type, count in dice_counts.items()
+        if die_type is not Dice.PERCENTILE
+    )
+
+
+def resolve_method(
+    dice_counts: Mapping[Dice, int],
+    method: str = "auto",
+    threshold: Optional[int] = None,
+) -> str:
+    """
+    The method to use for the pool: method itself, or for auto, exact up
+    to threshold (or APPROXIMATION_THRESHOLD) symbol dice and saddlepoint
+    above it.
+    """
+    if method not in METHODS:
+        raise Exception(f"Unknown method {method}, expected one of {METHODS}")
+    if method != "auto":
+        return method
+    if threshold is None:
+        threshold = APPROXIMATION_THRESHOLD
+
+    return "saddlepoint" if symbol_dice_count(dice_counts) > threshold else "exact"
@@ -1,4 +1,9 @@
-from typing import cast
+import csv
+import heapq
+import json
+import random
+import sys
+from typing import Dict, Iterable, List, Optional, TextIO, Tuple
 
 import click
 from rich.console import Console
@@ -9,35 +14,380 @@ import textual.drivers.web_driver  # noqa: F401
 
 from genesys_dice.dice import (
     DicePool,
-    Symbol,
 )
 
+from genesys_dice.approximation import (
+    APPROXIMATION_METHODS,
+    APPROXIMATION_QUANTITIES,
+    APPROXIMATION_THRESHOLD,
+    METHODS,
+    Approximation,
+    approximate_cdf_table,
+    resolve_method,
+)
+from genesys_dice.grid import odds_grid
+from genesys_dice.lookup import build_lookup_table
+from genesys_dice.moments import QUANTITIES
+from genesys_dice.planner import DEFAULT_ACCURACY, DEFAULT_BUDGET
+from genesys_dice.registry import load_registry
+from genesys_dice.reroll import RerollPolicy
+from genesys_dice.rng import RNG_KINDS, make_rng, set_rng
+from genesys_dice.sampling import estimate_success_probability
+from genesys_dice.solver import SIDES, SOLVER_MAX_COST, solutions
+from genesys_dice.verify import VERIFY_POOLS, verify
 from genesys_dice.tui.rich import get_faces_table
 from genesys_dice.tui.app import DiceApp
 
 
-def command_success(dice: str) -> None:
-    success_rate = DicePool(dice).success_probability()
-    pprint(f"Success rate for {dice} is {success_rate}%")
+def command_success(
+    dice: str,
+    method: str = "auto",
+    accuracy: Optional[float] = None,
+    budget: Optional[float] = None,
+) -> None:
+    answer = DicePool(dice).success_odds(
+        accuracy, budget, None if method == "auto" else method
+    )
+    pprint(f"Success rate for {dice} is {answer}")
+
+
+def command_reroll(dice: str, policy: RerollPolicy) -> None:
+    pool = DicePool(dice)
+    without, with_talent = pool.reroll_odds(RerollPolicy(0)), pool.reroll_odds(policy)
+    caption = f"With: the {policy}" + ("" if policy.optimal else " (heuristic)")
+    table = Table(title=f"Odds for {dice}", caption=caption)
+    table.add_column("", style="cyan", no_wrap=True)
+    for name in ["Without", "With"]:
+        table.add_column(name, justify="right", style="magenta")
+
+    table.add_row(
+        "Success",
+        f"{without.success_probability * 100:.2f}%",
+        f"{with_talent.success_probability * 100:.2f}%",
+    )
+    table.add_row(
+        "Net advantage > 0",
+        f"{without.advantage_probability * 100:.2f}%",
+        f"{with_talent.advantage_probability * 100:.2f}%",
+    )
+    table.add_row(
+        "Mean net advantage",
+        f"{without.mean_advantage:.4f}",
+        f"{with_talent.mean_advantage:.4f}",
+    )
+
+    Console().print(table)
+
+
+def command_moments(dice: str) -> None:
+    moments = DicePool(dice).moments()
+    table = Table(title=f"Moments of {dice}")
+    table.add_column("", style="cyan", no_wrap=True)
+    for name in ["Mean", "Std dev", "Skewness"]:
+        table.add_column(name, justify="right", style="magenta")
+
+    for name in QUANTITIES:
+        quantity = getattr(moments, name)
+        if name == "percentile" and quantity.mean == 0:
+            continue
+        table.add_row(
+            name,
+            f"{quantity.mean:.4f}",
+            f"{quantity.deviation:.4f}",
+            f"{quantity.skewness:.4f}",
+        )
+
+    Console().print(table)
+
+
+def command_estimate(
+    dice: str,
+    samples: Optional[int],
+    tolerance: Optional[float],
+    jobs: int,
+    seed: Optional[int] = None,
+) -> None:
+    estimate = estimate_success_probability(
+        DicePool(dice).dice_counts,
+        samples=samples,
+        tolerance=tolerance,
+        jobs=jobs,
+        seed=seed,
+    )
+    pprint(f"Estimated success rate for {dice} is {estimate}")
+
+
+def command_table(
+    dice: str,
+    output_format: str = "table",
+    top: Optional[int] = None,
+    min_probability: Optional[float] = None,
+    pager: bool = False,
+    jobs: int = 1,
+) -> None:
+    stream = DicePool(dice).stream_results(jobs)
+    rows: Iterable[Tuple[str, float]] = stream.rows
 
+    if min_probability is not None:
+        rows = (row for row in rows if row[1] >= min_probability)
 
-def command_table(dice: str) -> None:
-    result, success_rate = DicePool(dice).results_table()
+    if top is not None:
+        rows = heapq.nlargest(top, rows, key=lambda row: row[1])
 
-    count = len(result)
+    if output_format == "csv":
+        writer = csv.writer(sys.stdout)
+        writer.writerow(["Result", "%"])
+        for rolls, probability in rows:
+            writer.writerow([rolls.strip(), probability])
+        writer.writerow(["Success Rate", stream.success_rate])
+        return
+
+    if output_format == "jsonl":
+        for rolls, probability in rows:
+            click.echo(
+                json.dumps(
+                    {"result": rolls.strip(), "probability": probability},
+                    ensure_ascii=False,
+                )
+            )
+        click.echo(json.dumps({"success_rate": stream.success_rate}))
+        return
+
+    rows = list(rows)
+    count = len(rows)
     table = Table(title=f"Results for dice {dice} ({count})", show_footer=True)
     table.add_column(
         "Result", justify="right", style="cyan", no_wrap=True, footer="Success Rate"
     )
     table.add_column("%", justify="right", style="magenta")
 
-    for rolls, probability in result.items():
+    for rolls, probability in rows:
         table.add_row(rolls, str(probability))
 
-    table.columns[1].footer = str(success_rate) + "%"
+    table.columns[1].footer = str(stream.success_rate) + "%"
 
     console = Console()
-    console.print(table)
+    if pager:
+        with console.pager(styles=True):
+            console.print(table)
+    else:
+        console.print(table)
+
+
+def print_distribution(title: str, expression: str, values: Dict[int, float]) -> None:
+    table = Table(title=title)
+    table.add_column(expression, justify="right", style="cyan")
+    table.add_column("%", justify="right", style="magenta")
+
+    for value, probability in values.items():
+        table.add_row(str(value), str(round(probability * 100, 2)))
+
+    Console().print(table)
+
+
+def print_approximate_distribution(
+    title: str, expression: str, values: Dict[int, Approximation]
+) -> None:
+    table = Table(title=title)
+    table.add_column(expression, justify="right", style="cyan")
+    table.add_column("%", justify="right", style="magenta")
+    table.add_column("± %", justify="right", style="magenta")
+
+    for value, approximation in values.items():
+        table.add_row(
+            str(value),
+            str(round(approximation.probability * 100, 2)),
+            str(round(approximation.error_bound * 100, 2)),
+        )
+
+    Console().print(table)
+
+
+def command_query(
+    dice: str,
+    conditions: Iterable[str],
+    given: Optional[str] = None,
+    expectations: Iterable[str] = (),
+    marginal: Optional[str] = None,
+    cdf: Optional[str] = None,
+    method: str = "auto",
+    threshold: Optional[int] = None,
+    samples: Optional[int] = None,
+    seed: Optional[int] = None,
+) -> None:
+    pool = DicePool(dice)
+    condition_str = f" | {given}" if given is not None else ""
+    dice_str = f" for dice {dice}"
+    conditions, expectations = list(conditions), list(expectations)
+
+    if samples is not None:
+        if len(expectations) > 0 or marginal is not None or cdf is not None:
+            raise click.ClickException("--samples only estimates conditions")
+
+        try:
+            for condition in conditions:
+                estimate = pool.estimate_probability(condition, given, samples, seed)
+                click.echo(f"P({condition}{condition_str}) ≈ {estimate}")
+        except Exception as e:
+            raise click.ClickException(str(e))
+        return
+    exact_questions = len(conditions) + len(expectations) > 0
+    approximable = (
+        cdf in APPROXIMATION_QUANTITIES and given is None and marginal is None
+    )
+
+    if method in APPROXIMATION_METHODS and (exact_questions or not approximable):
+        raise click.ClickException(
+            f"Only --cdf of {', '.join(APPROXIMATION_QUANTITIES)}, on its own,"
+            f" can be approximated"
+        )
+
+    if approximable and cdf is not None:
+        resolved = resolve_method(pool.dice_counts, method, threshold)
+        if resolved in APPROXIMATION_METHODS:
+            approximations = approximate_cdf_table(pool.dice_counts, cdf, resolved)
+            print_approximate_distribution(
+                f"P <= {cdf}{dice_str} ({resolved})", cdf, approximations
+            )
+            cdf = None
+
+    if not exact_questions and marginal is None and cdf is None:
+        return
+
+    query = pool.query()
+
+    try:
+        for condition in conditions:
+            probability = round(query.probability(condition, given) * 100, 2)
+            click.echo(f"P({condition}{condition_str}) = {probability}%")
+
+        for expression in expectations:
+            expectation = round(query.expectation(expression, given), 4)
+            click.echo(f"E[{expression}{condition_str}] = {expectation}")
+
+        if marginal is not None:
+            values = query.marginal(marginal, given)
+            print_distribution(
+                f"P {marginal}{condition_str}{dice_str}", marginal, values
+            )
+
+        if cdf is not None:
+            values = query.cdf(cdf, given)
+            print_distribution(f"P <= {cdf}{condition_str}{dice_str}", cdf, values)
+    except Exception as e:
+        raise click.ClickException(str(e))
+
+
+def command_solve(
+    dice: str,
+    target: float,
+    side: str = "negative",
+    max_cost: int = SOLVER_MAX_COST,
+    show_all: bool = False,
+) -> None:
+    found = solutions(DicePool(dice), target, side, max_cost)
+
+    if len(found) == 0:
+        click.echo(f"No pool within {max_cost} changes of {dice} reaches {target}%")
+        return
+
+    for solution in found if show_all else found[:1]:
+        click.echo(str(solution))
+
+
+def command_grid(output_format: str = "table", advantage: bool = False) -> None:
+    grid = odds_grid(advantage=advantage)
+
+    if output_format == "csv":
+        records = grid.records()
+        writer = csv.DictWriter(sys.stdout, fieldnames=list(records[0]))
+        writer.writeheader()
+        writer.writerows(records)
+        return
+
+    if output_format == "json":
+        click.echo(json.dumps(grid.records(), indent=2))
+        return
+
+    caption = "Success % (expected net advantage)" if advantage else "Success %"
+    table = Table(title="Odds by characteristic/skill and difficulty", caption=caption)
+    table.add_column("Char/Skill", justify="right", style="cyan", no_wrap=True)
+    for column in grid.columns:
+        table.add_column(
+            f"{column.label}\n{column.pool.dice}", justify="right", style="magenta"
+        )
+
+    for i, row in enumerate(grid.rows):
+        cells = []
+        for j in range(len(grid.columns)):
+            cell = str(grid.success[i][j])
+            if grid.advantage is not None:
+                cell += f" ({grid.advantage[i][j]:+})"
+            cells.append(cell)
+        table.add_row(f"{row.characteristic}/{row.skill} {row.pool.dice}", *cells)
+
+    Console().print(table)
+
+
+def parse_batch_line(line: str) -> Optional[Tuple[str, str]]:
+    """
+    The name and dice of a batch line, "NAME: DICE" or just "DICE", or None
+    for blank lines and comments.
+    """
+    line = line.strip()
+    if len(line) == 0 or line.startswith("#"):
+        return None
+
+    name, _, dice = line.rpartition(":")
+    return name.strip(), dice.strip()
+
+
+def command_batch(
+    lines: Iterable[str], seed: Optional[int] = None, output_format: str = "text"
+) -> None:
+    entries: List[Tuple[str, str]] = []
+    pools: List[DicePool] = []
+
+    for number, line in enumerate(lines, start=1):
+        entry = parse_batch_line(line)
+        if entry is None:
+            continue
+        try:
+            pools.append(DicePool(entry[1]))
+        except Exception as e:
+            raise click.ClickException(f"Line {number}: {line.strip()}: {e}")
+        entries.append(entry)
+
+    rolls = DicePool.roll_batch(pools, seed)
+
+    for i, (name, dice) in enumerate(entries):
+        result = rolls.result(i)
+        if output_format == "jsonl":
+            record = {
+                "name": name,
+                "dice": dice,
+                "success": int(rolls.success[i]),
+                "advantage": int(rolls.advantage[i]),
+                "triumph": int(rolls.triumph[i]),
+                "despair": int(rolls.despair[i]),
+                "percentiles": result.percentiles,
+            }
+            click.echo(json.dumps(record))
+        else:
+            label = f"{name} ({dice})" if len(name) > 0 else dice
+            click.echo(f"{label}: {result}")
+
+
+def command_verify(pools: int, seed: Optional[int] = None) -> None:
+    if seed is None:
+        seed = random.randrange(2**32)
+
+    click.echo(f"Verifying {pools} pools with seed {seed}")
+    verification = verify(pools, seed, on_mismatch=click.echo)
+    click.echo(str(verification))
+
+    if len(verification.mismatches) > 0:
+        sys.exit(1)
 
 
 def command_faces() -> None:
@@ -46,31 +396,184 @@ def command_faces() -> None:
     console.print(table)
 
 
-def command_roll(dice: str, details: bool) -> None:
-    result = DicePool(dice).roll()
+def command_roll(dice: str, details: bool, seed: Optional[int] = None) -> None:
+    result = DicePool(dice).roll(seed=seed, record_seed=details)
     if details:
-        for die_type, faces in result.details.items():
-            composed_str = f"{die_type.short_code}: "
-            str_faces = []
-            for face in faces:
-                if type(face) is list:
-                    str_faces.append(" ".join([s.unicode for s in face]))
-                else:
-                    symbol = cast(Symbol, face)
-                    str_faces.append(symbol.unicode)
-            composed_str += " | ".join(str_faces)
-            click.echo(composed_str)
+        click.echo(f"Seed: {result.seed}")
+        click.echo(result.details_str())
     click.echo(str(result))
 
 
-@click.command()
+class DefaultCommandGroup(click.Group):
+    """
+    Runs the roll command unless the first argument names another command,
+    so `genesys-dice PAADD` and `genesys-dice -s PAADD` keep working.
+    """
+
+    default_command = "roll"
+
+    def parse_args(self, ctx: click.Context, args: List[str]) -> List[str]:
+        if len(args) == 0 or args[0] not in self.commands:
+            args = [self.default_command, *args]
+
+        return super().parse_args(ctx, args)
+
+
+method_option = click.option(
+    "--method",
+    type=click.Choice(METHODS),
+    default="auto",
+    help="Compute odds exactly, or approximate them (auto: exactly up to"
+    " --approximate-above dice)",
+)
+threshold_option = click.option(
+    "--approximate-above",
+    "threshold",
+    type=click.IntRange(min=0),
+    default=APPROXIMATION_THRESHOLD,
+    help="With --method auto, approximate pools with more dice than this",
+)
+
+
+@click.group(cls=DefaultCommandGroup)
+def main() -> None:
+    load_registry()
+
+
+@main.command()
 @click.option("-d", is_flag=True, help="Print the details of the roll")
 @click.option("-t", is_flag=True, help="Print all rolls with probabilities")
 @click.option("-s", is_flag=True, help="Print the success rate of a roll")
 @click.option("-f", is_flag=True, help="Print the faces of the dice")
+@click.option(
+    "-m", is_flag=True, help="Print the mean, spread and skew of the net symbols"
+)
 @click.option("-u", is_flag=True, help="Run the TUI with initial dice")
+@click.option(
+    "--samples",
+    type=click.IntRange(min=1),
+    help="With -s, estimate the success rate from this many random rolls",
+)
+@click.option(
+    "--tolerance",
+    type=click.FloatRange(min=0, min_open=True),
+    help="With -s, estimate until the 95% interval is within +/- this (e.g. 0.005)",
+)
+@click.option(
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of worker processes for --samples and for -t on large pools",
+)
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(["table", "csv", "jsonl"]),
+    default="table",
+    help="With -t, how to print the rows; csv and jsonl are streamed",
+)
+@click.option(
+    "--top",
+    type=click.IntRange(min=1),
+    help="With -t, only print the K most likely rows",
+)
+@click.option(
+    "--min-probability",
+    type=click.FloatRange(min=0),
+    help="With -t, only print rows with at least this % chance",
+)
+@click.option("--pager", is_flag=True, help="With -t, page the table")
+@click.option(
+    "--seed",
+    type=click.IntRange(min=0),
+    help="Replay the roll with this seed (shown by -d), or seed the TUI session"
+    " or --samples",
+)
+@click.option(
+    "--rng",
+    "rng_kind",
+    type=click.Choice(RNG_KINDS),
+    default="random",
+    help="Random number generator to roll with",
+)
+@click.option(
+    "--verify",
+    "run_verify",
+    is_flag=True,
+    help="Check every probability engine against brute-force enumeration of"
+    " random pools (replayable with --seed)",
+)
+@click.option(
+    "--verify-pools",
+    type=click.IntRange(min=1),
+    default=VERIFY_POOLS,
+    help="With --verify, how many pools to check; raise it for a soak run",
+)
+@click.option(
+    "--method",
+    type=click.Choice(METHODS),
+    default="auto",
+    help="With -s, compute the success rate exactly or approximate it (auto:"
+    " let the planner pick the fastest engine for --accuracy and --budget)",
+)
+@click.option(
+    "--accuracy",
+    type=click.FloatRange(min=0, max=1),
+    default=DEFAULT_ACCURACY,
+    show_default=True,
+    help="With -s, the largest error to accept in the success rate",
+)
+@click.option(
+    "--budget",
+    type=click.FloatRange(min=0, min_open=True),
+    default=DEFAULT_BUDGET,
+    show_default=True,
+    help="With -s, roughly how many seconds the planner may spend",
+)
+@click.option(
+    "--reroll",
+    type=click.IntRange(min=1),
+    help="With -s, compare the odds with a talent that rerolls up to this many"
+    " dice after the roll",
+)
+@click.option(
+    "--reroll-dice",
+    help="With --reroll, only dice of these short codes may be rerolled" " (e.g. DC)",
+)
+@click.option("--remove", is_flag=True, help="With --reroll, remove the dice instead")
+@click.option(
+    "--opponent",
+    is_flag=True,
+    help="With --reroll, an opponent chooses the dice to make the check fail",
+)
 @click.argument("dice", required=False)
-def main(d: bool, t: bool, s: bool, f: bool, u: bool, dice: str) -> None:
+def roll(
+    d: bool,
+    t: bool,
+    s: bool,
+    f: bool,
+    m: bool,
+    u: bool,
+    samples: Optional[int],
+    tolerance: Optional[float],
+    jobs: int,
+    output_format: str,
+    top: Optional[int],
+    min_probability: Optional[float],
+    pager: bool,
+    seed: Optional[int],
+    rng_kind: str,
+    run_verify: bool,
+    verify_pools: int,
+    method: str,
+    accuracy: float,
+    budget: float,
+    reroll: Optional[int],
+    reroll_dice: Optional[str],
+    remove: bool,
+    opponent: bool,
+    dice: str,
+) -> None:
     """
     \b
     A dice roller and probablity calculator for the Genesys RPG system.
@@ -88,23 +591,203 @@ def main(d: bool, t: bool, s: bool, f: bool, u: bool, dice: str) -> None:
     PERCENTILE = T
 
     1 Proficiency (yellow) 2 Ability (green) against 2 Difficulty (purple) is: PAADD
+
+    \b
+    Other commands (see genesys-dice COMMAND --help):
+    build-table  Precompute the odds lookup table
+    query        Ask about the odds of any outcome
+    solve        Find the cheapest difficulty for a target success rate
+    grid         Print odds for every characteristic, skill and difficulty
+    batch        Roll many pools at once
     """
 
-    if s:
-        command_success(dice)
+    if rng_kind == "urandom" and seed is not None:
+        raise click.BadParameter(
+            "can't be used with --rng urandom", param_hint="--seed"
+        )
+
+    if run_verify:
+        command_verify(verify_pools, seed)
+    elif s and (samples is not None or tolerance is not None):
+        command_estimate(dice, samples, tolerance, jobs, seed)
+    elif s and reroll is not None:
+        objective = "opponent" if opponent else "player"
+        try:
+            policy = RerollPolicy.from_codes(reroll, reroll_dice, remove, objective)
+        except Exception as e:
+            raise click.BadParameter(str(e), param_hint="--reroll-dice")
+        command_reroll(dice, policy)
+    elif s:
+        command_success(dice, method, accuracy, budget)
+    elif m:
+        command_moments(dice)
     elif t:
-        command_table(dice)
+        command_table(dice, output_format, top, min_probability, pager, jobs)
     elif f:
         command_faces()
     else:
-        if dice is None:
-            app = DiceApp()
-            app.run()
-        elif u:
+        if dice is None or u:
+            set_rng(make_rng(rng_kind, seed))
             app = DiceApp(dice)
             app.run()
         else:
-            command_roll(dice, d)
+            set_rng(make_rng(rng_kind))
+            command_roll(dice, d, seed)
+
+
+@main.command()
+@click.option("--given", help="Condition every answer on this")
+@click.option(
+    "-e",
+    "--expect",
+    "expectations",
+    multiple=True,
+    help="Print the expected value of this expression",
+)
+@click.option("--marginal", help="Print the chance of each value of this expression")
+@click.option("--cdf", help="Print the chance of at most each value of this")
+@method_option
+@threshold_option
+@click.option(
+    "--samples",
+    type=click.IntRange(min=100),
+    help="Estimate the conditions by importance sampling this many rolls, for"
+    " rare outcomes of pools too large to compute exactly",
+)
+@click.option(
+    "--seed",
+    type=click.IntRange(min=0),
+    help="With --samples, make the estimates reproducible",
+)
+@click.argument("dice")
+@click.argument("conditions", nargs=-1)
+def query(
+    given: Optional[str],
+    expectations: Tuple[str, ...],
+    marginal: Optional[str],
+    cdf: Optional[str],
+    method: str,
+    threshold: int,
+    samples: Optional[int],
+    seed: Optional[int],
+    dice: str,
+    conditions: Tuple[str, ...],
+) -> None:
+    """
+    \b
+    Print the chance of each condition for the dice, e.g.
+    genesys-dice query PAADD "success > 0 and advantage >= 2" "triumph > 0"
+    genesys-dice query PAADD -e threat --given "success <= 0"
+    genesys-dice query PAADD --cdf advantage
+    genesys-dice query PPPPPCCCCC "triumph >= 4 and despair == 0" --samples 20000
+
+    \b
+    Conditions and expressions use Python syntax over the outcome of a roll:
+    success    Net successes (negative for net failures)
+    advantage  Net advantages (negative for net threats)
+    triumph    Triumphs
+    despair    Despairs
+    failure    Net failures
+    threat     Net threats
+    percentile Sum of the percentile dice
+    """
+    command_query(
+        dice,
+        conditions,
+        given,
+        expectations,
+        marginal,
+        cdf,
+        method,
+        threshold,
+        samples,
+        seed,
+    )
+
+
+@main.command()
+@click.option(
+    "--side",
+    type=click.Choice(list(SIDES)),
+    default="negative",
+    help="Add and upgrade negative (D, C, S) or positive (A, P, B) dice",
+)
+@click.option(
+    "--max-cost",
+    type=click.IntRange(min=0),
+    default=SOLVER_MAX_COST,
+    help="Most dice added plus upgrades made",
+)
+@click.option(
+    "--all",
+    "show_all",
+    is_flag=True,
+    help="Print the cheapest pool for every mix of upgrades and extra dice",
+)
+@click.argument("dice")
+@click.argument("target", type=click.FloatRange(min=0, max=100))
+def solve(side: str, max_cost: int, show_all: bool, dice: str, target: float) -> None:
+    """
+    \b
+    Find the fewest dice to add, and upgrades to make, that bring the
+    success rate of the dice to at most TARGET % (or, with --side positive,
+    at least TARGET %), e.g. genesys-dice solve PPAA 40
+    """
+    command_solve(dice, target, side, max_cost, show_all)
+
+
+@main.command()
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(["table", "csv", "json"]),
+    default="table",
+    help="Print a table, or one record per cell as CSV or JSON",
+)
+@click.option("--advantage", is_flag=True, help="Include the expected net advantage")
+def grid(output_format: str, advantage: bool) -> None:
+    """
+    Print the success rate of every check from characteristic 1-5 and
+    skill 0-5 against Easy to Formidable difficulty with 0-3 upgrades to
+    challenge.
+    """
+    command_grid(output_format, advantage)
+
+
+@main.command()
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(["text", "jsonl"]),
+    default="text",
+    help="Print each roll as text, or as a JSON record",
+)
+@click.option("--seed", type=click.IntRange(min=0), help="Seed the rolls")
+@click.argument("pools", type=click.File("r"), default="-")
+def batch(output_format: str, seed: Optional[int], pools: TextIO) -> None:
+    """
+    \b
+    Roll every pool in POOLS (a file, or standard input by default) at
+    once, one pool per line, optionally named, e.g.
+    printf "Minions: AADD\\nRival: PAD\\n" | genesys-dice batch
+    Blank lines and lines starting with # are skipped.
+    """
+    command_batch(pools, seed, output_format)
+
+
+@main.command("build-table")
+@click.option(
+    "--path",
+    type=click.Path(dir_okay=False, writable=True),
+    help="Where to write the table (defaults to the user cache directory)",
+)
+def build_table(path: Optional[str]) -> None:
+    """
+    Precompute exact odds for up to 6 of each positive die against up to 6
+    of each negative die.  Once built, success rates of covered pools are
+    read straight from the table.
+    """
+    click.echo(f"Wrote lookup table to {build_lookup_table(path)}")
 
 
 if __name__ == "__main__":
@@ -1,9 +1,33 @@
+from array import array
 from collections import Counter
 from dataclasses import asdict, dataclass, field, is_dataclass
 from enum import StrEnum
-import itertools
-import random
-from typing import Any, Dict, List, Literal, Optional, Tuple, Self, cast
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Literal,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Self,
+    cast,
+)
+
+from genesys_dice.rng import RNG, RandomRNG, get_rng
+
+if TYPE_CHECKING:
+    from genesys_dice.importance import RareEstimate
+    from genesys_dice.moments import PoolMoments
+    from genesys_dice.planner import Answer
+    from genesys_dice.probability import ResultsStream
+    from genesys_dice.query import Query
+    from genesys_dice.reroll import RerollOdds, RerollPolicy
+    from genesys_dice.sampling import Rolls
 
 
 ResultSymbol = Literal["❂", "✷", "▲", "⦻", "⨯", "⎊", "□"]
@@ -118,6 +142,10 @@ class Dice(StrEnum):
     def faces(self) -> List["Face"]:
         return dice_map[self].faces
 
+    @property
+    def table(self) -> Tuple["SymbolVector", ...]:
+        return dice_map[self].table
+
     @property
     def upgrade(self) -> Optional["Dice"]:
         return dice_map[self].upgrade
@@ -126,8 +154,8 @@ class Dice(StrEnum):
     def downgrade(self) -> Optional["Dice"]:
         return dice_map[self].downgrade
 
-    def roll(self) -> "DieResult":
-        return dice_map[self].roll()
+    def roll(self, rng: Optional[RNG] = None) -> "DieResult":
+        return dice_map[self].roll(rng)
 
     @staticmethod
     def has_short_code(short_code: str) -> bool:
@@ -168,15 +196,82 @@ Face = int | Symbol | list[Symbol]
 DieResult = tuple[Dice, Face]
 
 
+class SymbolVector(NamedTuple):
+    """
+    Raw symbol counts, before any cancellation, of one face or of several
+    faces summed together.
+    """
+
+    success: int = 0
+    failure: int = 0
+    advantage: int = 0
+    threat: int = 0
+    triumph: int = 0
+    despair: int = 0
+
+    @staticmethod
+    def from_face(face: Face) -> "SymbolVector":
+        if type(face) is int:
+            return SymbolVector()
+
+        counts = Counter(face if type(face) is list else [face])
+
+        return SymbolVector(
+            success=counts[Symbol.SUCCESS],
+            failure=counts[Symbol.FAILURE],
+            advantage=counts[Symbol.ADVANTAGE],
+            threat=counts[Symbol.THREAT],
+            triumph=counts[Symbol.TRIUMPH],
+            despair=counts[Symbol.DESPAIR],
+        )
+
+    @staticmethod
+    def sum(vectors: Iterable["SymbolVector"]) -> "SymbolVector":
+        return SymbolVector(*(sum(column) for column in zip(*vectors)))
+
+    @property
+    def net_success(self) -> int:
+        """
+        Triumphs count as successes and despairs as failures.
+        """
+        return self.success + self.triumph - self.failure - self.despair
+
+    @property
+    def net_advantage(self) -> int:
+        return self.advantage - self.threat
+
+
+Nets = Tuple[int, int, int, int]
+
+NO_NETS: Nets = (0, 0, 0, 0)
+
+
+def face_nets(face: Face) -> Nets:
+    """
+    Net success, net advantage, triumph and despair of a single face.
+    """
+    vector = SymbolVector.from_face(face)
+    return vector.net_success, vector.net_advantage, vector.triumph, vector.despair
+
+
 @dataclass
 class Die:
     die_type: Dice
     faces: List[Face] = field(default_factory=list)
     upgrade: Optional[Dice] = None
     downgrade: Optional[Dice] = None
+    table: Tuple[SymbolVector, ...] = field(default=(), init=False)
+    nets: Tuple[Nets, ...] = field(default=(), init=False)
+
+    def __post_init__(self) -> None:
+        self.table = tuple(SymbolVector.from_face(face) for face in self.faces)
+        self.nets = tuple(face_nets(face) for face in self.faces)
+
+    def roll_index(self, rng: Optional[RNG] = None) -> int:
+        return (rng or get_rng()).randrange(len(self.faces))
 
-    def roll(self) -> DieResult:
-        return self.die_type, random.choice(self.faces)
+    def roll(self, rng: Optional[RNG] = None) -> DieResult:
+        return self.die_type, self.faces[self.roll_index(rng)]
 
 
 Boost = Die(
@@ -286,81 +381,158 @@ dice_map[Dice.CHALLENGE] = Challenge
 dice_map[Dice.PERCENTILE] = Percentile
 
 
-@dataclass
+DIE_CODES: List[Dice] = list(Dice)
+"""
+Die types by the one-byte code a Result stores them under.
+"""
+
+DIE_CODE_MAP: Dict[Dice, int] = {die_type: i for i, die_type in enumerate(DIE_CODES)}
+
+TOTAL_SYMBOLS = [
+    Symbol.TRIUMPH,
+    Symbol.SUCCESS,
+    Symbol.ADVANTAGE,
+    Symbol.DESPAIR,
+    Symbol.FAILURE,
+    Symbol.THREAT,
+]
+
+
 class Result:
+    """
+    A rolled pool, kept compactly: the running net totals as fixed-width
+    integers, plus one byte each for the die type and face index of every
+    die.  Totals are updated as each die is added, and faces and per-die
+    details are only built when asked for.
+    """
+
+    __slots__ = ("nets", "codes", "indices", "loose", "seed")
 
     @staticmethod
-    def default_totals() -> Dict[Any, Any]:
+    def default_totals() -> Dict[Symbol, int]:
+        return {symbol: 0 for symbol in TOTAL_SYMBOLS}
+
+    def __init__(self, results: Iterable[Face] = ()) -> None:
+        # Net success, net advantage, triumph and despair
+        self.nets = array("i", NO_NETS)
+        self.codes = bytearray()
+        self.indices = bytearray()
+        # Faces added without a die type, which have no details
+        self.loose: Optional[List[Face]] = None
+        self.seed: Optional[int] = None
+
+        for face in results:
+            if self.loose is None:
+                self.loose = []
+            self.loose.append(face)
+            self.add_nets(face_nets(face))
+
+    @staticmethod
+    def from_totals(
+        success: int,
+        advantage: int,
+        triumph: int = 0,
+        despair: int = 0,
+        percentiles: Iterable[int] = (),
+    ) -> "Result":
+        """
+        A result with the given net totals (negative for failure and
+        threat) and percentile rolls.
+        """
+        result = Result()
+        result.add_nets((success, advantage, triumph, despair))
+
+        for percentile in percentiles:
+            result.add_index(Dice.PERCENTILE, Dice.PERCENTILE.faces.index(percentile))
+
+        return result
+
+    @property
+    def success(self) -> Optional[bool]:
+        net_success = self.nets[0]
+
+        if net_success > 0:
+            return True
+        elif net_success < 0:
+            return False
+        else:
+            return None
+
+    @property
+    def totals(self) -> Dict[Symbol, int]:
+        """
+        Symbol counts after successes have cancelled failures and advantages
+        have cancelled threats.
+        """
+        net_success, net_advantage, triumph, despair = self.nets
+
         return {
-            Symbol.TRIUMPH: 0,
-            Symbol.SUCCESS: 0,
-            Symbol.ADVANTAGE: 0,
-            Symbol.DESPAIR: 0,
-            Symbol.FAILURE: 0,
-            Symbol.THREAT: 0,
-            "Percentile": [],
+            Symbol.TRIUMPH: triumph,
+            Symbol.SUCCESS: max(net_success, 0),
+            Symbol.ADVANTAGE: max(net_advantage, 0),
+            Symbol.DESPAIR: despair,
+            Symbol.FAILURE: max(-net_success, 0),
+            Symbol.THREAT: max(-net_advantage, 0),
         }
 
-    results: List[Face] = field(default_factory=list)
+    @property
+    def percentiles(self) -> List[int]:
+        code = DIE_CODE_MAP[Dice.PERCENTILE]
+        faces = Dice.PERCENTILE.faces
+        percentiles = [
+            cast(int, faces[i]) for c, i in zip(self.codes, self.indices) if c == code
+        ]
 
-    details: Dict[Dice, List[Face]] = field(default_factory=dict, init=False)
-    totals: Dict[Any, Any] = field(default_factory=default_totals, init=False)
-    _success: Optional[bool] = field(default=None, init=False)
+        for face in self.loose or []:
+            if type(face) is int:
+                percentiles.append(face)
 
-    def __post_init__(self) -> None:
-        if len(self.results) > 0:
-            self.reduce()
+        return percentiles
 
     @property
-    def success(self) -> Optional[bool]:
-        return self._success
+    def details(self) -> Dict[Dice, List[Face]]:
+        details: Dict[Dice, List[Face]] = {}
 
-    def reduce(self) -> Self:
-        for face in self.results:
-            if type(face) is list:
-                for symbol in face:
-                    self.add_symbol(symbol)
-            else:
-                self.add_symbol(face)
+        for code, index in zip(self.codes, self.indices):
+            die_type = DIE_CODES[code]
+            details.setdefault(die_type, []).append(die_type.faces[index])
 
-        if self.totals[Symbol.SUCCESS] > 0:
-            self._success = True
-        elif self.totals[Symbol.FAILURE] > 0:
-            self._success = False
-        else:
-            self._success = None
+        return details
 
-        return self
+    @property
+    def results(self) -> List[Face]:
+        faces = [
+            DIE_CODES[code].faces[index]
+            for code, index in zip(self.codes, self.indices)
+        ]
 
-    def add_symbol(self, result: Face) -> None:
-        match result:
-            case int():
-                self.totals["Percentile"].append(result)
-            case Symbol.BLANK:
-                pass
-            case Symbol():
-                opposite = result.opposite
+        return (self.loose or []) + faces
 
-                if result is Symbol.TRIUMPH or result is Symbol.DESPAIR:
-                    result_add = opposite.opposite
-                    self.totals[result] += 1
-                else:
-                    result_add = result
+    def reduce(self) -> Self:
+        """
+        Totals are kept reduced as dice are added, so there is nothing left
+        to do; kept so that callers can still chain it.
+        """
+        return self
 
-                if self.totals[opposite] == 0:
-                    self.totals[result_add] += 1
-                else:
-                    self.totals[opposite] -= 1
+    def add_nets(self, nets: Iterable[int]) -> None:
+        totals = self.nets
+        for i, value in enumerate(nets):
+            totals[i] += value
 
     def add(self, result: DieResult) -> None:
         die_type, face = result
-
-        if die_type in self.details:
-            self.details[die_type].append(face)
-        else:
-            self.details[die_type] = [face]
-
-        self.results.append(face)
+        self.add_index(die_type, die_type.faces.index(face))
+
+    def add_index(self, die_type: Dice, index: int) -> None:
+        success, advantage, triumph, despair = dice_map[die_type].nets[index]
+        totals = self.nets
+        totals[0] += success
+        totals[1] += advantage
+        totals[2] += triumph
+        totals[3] += despair
+        self.codes.append(DIE_CODE_MAP[die_type])
+        self.indices.append(index)
 
     def details_str(self) -> str:
         lines = []
@@ -383,33 +555,143 @@ class Result:
 
     def __str__(self) -> str:
         composed_str = ""
-        for symbol in [
-            Symbol.TRIUMPH,
-            Symbol.SUCCESS,
-            Symbol.ADVANTAGE,
-            Symbol.DESPAIR,
-            Symbol.FAILURE,
-            Symbol.THREAT,
-        ]:
-            composed_str += self.totals[symbol] * symbol.unicode
+        totals = self.totals
+        for symbol in TOTAL_SYMBOLS:
+            composed_str += totals[symbol] * symbol.unicode
 
         composed_str = " ".join(composed_str)
-        composed_str += " " + " ".join(map(str, self.totals["Percentile"]))
+        composed_str += " " + " ".join(map(str, self.percentiles))
 
         return composed_str
 
 
-@dataclass()
-class DicePool:
+COUNT_BITS = 16
+"""
+Bits given to each die type's count in a DiceCounts key.
+"""
+
+
+class DiceCounts(Mapping[Dice, int]):
+    """
+    Immutable count of each die type in a pool, in DIE_CODES order.  The
+    counts are also packed into a single int key, so that equal pools hash
+    and compare in constant time.
+    """
+
+    __slots__ = ("counts", "key", "_dice")
+
+    def __init__(self, counts: Iterable[int] = ()) -> None:
+        self.counts: Tuple[int, ...] = tuple(counts) or (0,) * len(DIE_CODES)
+        self.key = 0
+        self._dice: Optional[Tuple[Dice, ...]] = None
+
+        if len(self.counts) != len(DIE_CODES):
+            raise Exception(f"Expected {len(DIE_CODES)} counts, got {self.counts}")
+
+        for count in reversed(self.counts):
+            if not 0 <= count < 2**COUNT_BITS:
+                raise Exception(f"Invalid die count: {count}")
+            self.key = (self.key << COUNT_BITS) | count
+
     @staticmethod
-    def default_dice() -> Dict[Dice, int]:
-        d = {}
+    def from_dice(dice: Iterable[Dice]) -> "DiceCounts":
+        counts = [0] * len(DIE_CODES)
 
-        for die_type in Dice:
-            d[die_type] = 0
+        for die_type in dice:
+            counts[DIE_CODE_MAP[die_type]] += 1
 
-        return d
+        return DiceCounts(counts)
+
+    def __getitem__(self, die_type: Dice) -> int:
+        return self.counts[DIE_CODE_MAP[die_type]]
+
+    def __iter__(self) -> Iterator[Dice]:
+        return iter(DIE_CODES)
+
+    def __len__(self) -> int:
+        return len(DIE_CODES)
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, DiceCounts):
+            return self.key == other.key
+
+        return super().__eq__(other)
+
+    def __repr__(self) -> str:
+        return f"DiceCounts({self.roll_str()!r})"
+
+    def add(self, die_type: Dice, count: int = 1) -> "DiceCounts":
+        """
+        A copy with count more (or, if negative, fewer) of die_type.
+        """
+        counts = list(self.counts)
+        counts[DIE_CODE_MAP[die_type]] += count
 
+        return DiceCounts(counts)
+
+    def modify(
+        self, die_type: Dice, modifier: Optional[Modifier] = None
+    ) -> "DiceCounts":
+        """
+        A copy with the modifier applied to one die_type die.  Upgrading
+        with none of that die to upgrade adds one instead, and downgrading
+        with nothing to downgrade to removes it.
+        """
+        counts = self
+
+        match modifier:
+            case Modifier.ADD:
+                counts = counts.add(die_type)
+            case Modifier.UPGRADE:
+                if die_type.upgrade and counts[die_type] > 0:
+                    counts = counts.add(die_type, -1).add(die_type.upgrade)
+                else:
+                    counts = counts.add(die_type)
+            case Modifier.REMOVE:
+                if counts[die_type] > 0:
+                    counts = counts.add(die_type, -1)
+            case Modifier.DOWNGRADE:
+                if counts[die_type] > 0:
+                    if die_type.downgrade:
+                        counts = counts.add(die_type, -1).add(die_type.downgrade)
+                    else:
+                        counts = counts.add(die_type, -1)
+            case _:
+                pass
+
+        return counts
+
+    def nonzero(self) -> Iterator[Tuple[Dice, int]]:
+        for die_type, count in zip(DIE_CODES, self.counts):
+            if count > 0:
+                yield die_type, count
+
+    @property
+    def dice(self) -> Tuple[Dice, ...]:
+        """
+        Every die in the pool, expanded once and then kept.
+        """
+        if self._dice is None:
+            self._dice = tuple(
+                die_type for die_type, count in self.nonzero() for _ in range(count)
+            )
+
+        return self._dice
+
+    def total(self) -> int:
+        return sum(self.counts)
+
+    def roll_str(self) -> str:
+        return "".join(
+            die_type.short_code * count for die_type, count in self.nonzero()
+        )
+
+
+@dataclass()
+class DicePool:
     @staticmethod
     def dict_factory(dict_src: List[Tuple[str, Any]]) -> Dict[str, Any]:
         """
@@ -434,11 +716,18 @@ class DicePool:
     name: str = ""
     description: str = ""
     additional_effects: List["AdditionalEffectOption"] = field(default_factory=list)
-    dice_counts: Dict[Dice, int] = field(default_factory=default_dice, init=False)
+    dice_counts: DiceCounts = field(default_factory=DiceCounts, init=False)
 
     def __post_init__(self) -> None:
         self.set_dice(self.dice)
 
+    def __hash__(self) -> int:
+        """
+        Pools hash by their dice, so they can be used as cache keys; don't
+        modify a pool while it is one.
+        """
+        return hash(self.dice_counts)
+
     def asdict(self) -> Dict[str, Any]:
         return asdict(self, dict_factory=DicePool.dict_factory)
 
@@ -446,35 +735,19 @@ class DicePool:
         return len(self.dice)
 
     def set_dice(self, dice_str: str) -> Self:
-        for die_type in get_dice_from_str(dice_str):
-            self.dice_counts[die_type] += 1
+        added = DiceCounts.from_dice(get_dice_from_str(dice_str))
+        self.dice_counts = DiceCounts(
+            a + b for a, b in zip(self.dice_counts.counts, added.counts)
+        )
 
         return self
 
     def modify(self, die_type: Dice, modifier: Optional[Modifier] = None) -> Self:
-        match modifier:
-            case Modifier.ADD:
-                self.dice_counts[die_type] += 1
-            case Modifier.UPGRADE:
-                if die_type.upgrade and self.dice_counts[die_type] > 0:
-                    self.dice_counts[die_type] -= 1
-                    self.dice_counts[die_type.upgrade] += 1
-                else:
-                    self.dice_counts[die_type] += 1
-            case Modifier.REMOVE:
-                if self.dice_counts[die_type] > 0:
-                    self.dice_counts[die_type] -= 1
-            case Modifier.DOWNGRADE:
-                if self.dice_counts[die_type] > 0:
-                    if die_type.downgrade:
-                        self.dice_counts[die_type] -= 1
-                        self.dice_counts[die_type.downgrade] += 1
-                    else:
-                        self.dice_counts[die_type] -= 1
-            case _:
-                pass
+        counts = self.dice_counts.modify(die_type, modifier)
 
-        self.dice = self.roll_str()
+        if counts is not self.dice_counts:
+            self.dice_counts = counts
+            self.dice = counts.roll_str()
 
         return self
 
@@ -490,34 +763,67 @@ class DicePool:
 
         self.additional_effects.remove(effect)
 
-    def roll(self) -> Result:
+    def roll(
+        self,
+        rng: Optional[RNG] = None,
+        seed: Optional[int] = None,
+        record_seed: bool = False,
+    ) -> Result:
+        """
+        Roll with rng (or the session RNG).  Given a seed, or with
+        record_seed, the roll is made from a seed of its own, which is kept
+        on the Result; rolling again with that seed replays it.
+        """
+        if seed is None and record_seed:
+            seed = (rng or get_rng()).spawn_seed()
+        if seed is not None:
+            rng = RandomRNG(seed)
+
         roll_result = Result()
+        dice = self.dice_counts.dice
+        indices = (rng or get_rng()).indices([len(d.faces) for d in dice])
 
-        for die_type in self.get_dice():
-            die_result: DieResult = die_type.roll()
-            roll_result.add(die_result)
+        for die_type, index in zip(dice, indices):
+            roll_result.add_index(die_type, index)
+
+        roll_result.seed = seed
+
+        return roll_result
+
+    def roll_many(self, n: int, seed: Optional[int] = None) -> "Rolls":
+        """
+        Roll the pool n times at once, returning columns of net totals
+        rather than a Result per roll.
+        """
+        import numpy as np
+
+        from genesys_dice.sampling import roll_many
+
+        return roll_many(self.dice_counts, n, np.random.default_rng(seed))
+
+    @staticmethod
+    def roll_batch(pools: Iterable["DicePool"], seed: Optional[int] = None) -> "Rolls":
+        """
+        Roll every pool once in a single vectorized pass, returning columns
+        of net totals with one row per pool, in order.
+        """
+        import numpy as np
+
+        from genesys_dice.sampling import roll_batch
 
-        return roll_result.reduce()
+        return roll_batch(
+            [pool.dice_counts for pool in pools], np.random.default_rng(seed)
+        )
 
     def get_dice(self, keys: Optional[List[Dice]] = None) -> List[Dice]:
         """
         Get all dice as a list.  If keys is supplied, only get the dice for
         those keys.
         """
-        dice = []
-
-        if keys is not None:
-            dice_items = {
-                k: v for k, v in self.dice_counts.items() if k in keys
-            }.items()
-        else:
-            dice_items = self.dice_counts.items()
-
-        for die_type, count in dice_items:
-            for _ in range(1, count + 1):
-                dice.append(die_type)
+        if keys is None:
+            return list(self.dice_counts.dice)
 
-        return dice
+        return [die_type for die_type in self.dice_counts.dice if die_type in keys]
 
     def get_dice_faces(self) -> List[List[Face]]:
         faces = []
@@ -527,52 +833,111 @@ class DicePool:
 
         return faces
 
-    def success_probability(self) -> float:
-        dice_faces = self.get_dice_faces()
-        product = list(itertools.product(*dice_faces))
-        total = len(product)
-        success_count = 0
+    def success_probability(
+        self, method: str = "auto", threshold: Optional[int] = None
+    ) -> float:
+        """
+        Exactly, or above threshold dice (see approximation.resolve_method)
+        or when method asks for it, approximately.
+        """
+        from genesys_dice.approximation import (
+            APPROXIMATION_METHODS,
+            approximate_success,
+            resolve_method,
+        )
+        from genesys_dice.lookup import lookup
+        from genesys_dice.probability import success_probability
+
+        method = resolve_method(self.dice_counts, method, threshold)
+        if method in APPROXIMATION_METHODS:
+            approximation = approximate_success(self.dice_counts, method)
+            return round(approximation.probability * 100, 2)
+
+        record = lookup(self.dice_counts)
+        if record is not None:
+            return round(record.success * 100, 2)
+
+        return success_probability(self.dice_counts)
+
+    def success_odds(
+        self,
+        accuracy: Optional[float] = None,
+        budget: Optional[float] = None,
+        engine: Optional[str] = None,
+    ) -> "Answer":
+        """
+        The success rate from whichever engine the planner expects to be
+        fastest at that accuracy within the budget (see planner).
+        """
+        from genesys_dice.planner import success_odds
+
+        return success_odds(self.dice_counts, accuracy, budget, engine)
 
-        for result in product:
-            if is_success(list(result)):
-                success_count += 1
+    def moments(self) -> "PoolMoments":
+        """
+        Mean, variance and skewness of the net symbols, for a pool of any
+        size.
+        """
+        from genesys_dice.moments import pool_moments
 
-        return round(success_count / total * 100, 2)
+        return pool_moments(self.dice_counts)
 
-    def results_table(self) -> Tuple[Dict[str, float], float]:
-        dice_faces = self.get_dice_faces()
-        product = list(itertools.product(*dice_faces))
-        total = len(product)
-        reduced: Dict[str, float] = {}
-        success_count = 0
-        for combo in product:
-            r = str(Result(list(combo)).reduce())
+    def results_table(self, jobs: int = 1) -> Tuple[Dict[str, float], float]:
+        from genesys_dice.probability import results_table
 
-            if Symbol.SUCCESS.unicode in r:
-                success_count += 1
+        return results_table(self.dice_counts, jobs)
 
-            if r in reduced:
-                reduced[r] += 1
-            else:
-                reduced[r] = 1
+    def stream_results(self, jobs: int = 1) -> "ResultsStream":
+        """
+        Like results_table, but rows are produced one at a time.
+        """
+        from genesys_dice.probability import stream_results
 
-        for item in reduced:
-            reduced[item] = round(reduced[item] / total * 100, 2)
+        return stream_results(self.dice_counts, jobs)
 
-        success_rate = round(success_count / total * 100, 2)
+    def query(self) -> "Query":
+        """
+        Ask questions of the pool's outcome distribution, e.g.
+        pool.query().probability("success > 0 and advantage >= 2").
+        """
+        from genesys_dice.query import pool_query
 
-        return reduced, success_rate
+        return pool_query(self.dice_counts)
 
-    def roll_str(self) -> str:
-        composed_str = ""
+    def estimate_probability(
+        self,
+        condition: str,
+        given: Optional[str] = None,
+        samples: Optional[int] = None,
+        seed: Optional[int] = None,
+    ) -> "RareEstimate":
+        """
+        P(condition) by importance sampling, for rare outcomes of pools too
+        large for query().
+        """
+        from genesys_dice.importance import (
+            IMPORTANCE_SAMPLES,
+            importance_probability,
+        )
 
-        for die_type, count in self.dice_counts.items():
-            composed_str += die_type.short_code * count
+        return importance_probability(
+            self.dice_counts, condition, given, samples or IMPORTANCE_SAMPLES, seed
+        )
 
-        return composed_str
+    def reroll_odds(self, policy: "RerollPolicy") -> "RerollOdds":
+        """
+        Exact success and net advantage odds when a talent lets dice be
+        rerolled or removed after the roll (see reroll).
+        """
+        from genesys_dice.reroll import reroll_odds
+
+        return reroll_odds(self.dice_counts, policy)
+
+    def roll_str(self) -> str:
+        return self.dice_counts.roll_str()
 
     def is_empty(self) -> bool:
-        return sum(self.dice_counts.values()) == 0
+        return self.dice_counts.key == 0
 
     def to_foundry_str(self) -> str:
         macro_args = []
@@ -641,6 +1006,17 @@ class AdditionalEffectOption:
     def __hash__(self) -> int:
         return hash((self.name, self.description, self.difficulty))
 
+    def apply(self, counts: DiceCounts, remove: bool = False) -> DiceCounts:
+        """
+        counts with this effect added, or with remove, taken back off.
+        """
+        modifier = self.modifier.opposite if remove else self.modifier
+
+        for die_type in self.dice:
+            counts = counts.modify(die_type, modifier)
+
+        return counts
+
 
 @dataclass
 class AdditionalEffects:
@@ -679,6 +1055,9 @@ def count_symbols(roll_result: List[Face]) -> Dict[Symbol, int]:
             flat.extend(face)
         elif type(face) is Symbol:
             flat.append(face)
+        elif type(face) is int:
+            # Percentile faces carry no symbols
+            continue
         else:
             raise Exception(f"{face} is a buggy face?")
     return Counter(flat)
@@ -0,0 +1,156 @@
+"""
+Success rates for a whole grid of checks at once: characteristic and
+skill down the rows, difficulty and upgrades to challenge across the
+columns.
+
+The positive dice of every row and the negative dice of every column
+are reduced to net-success histograms once each, through the shared
+prefix caches, and each cell only combines a row with a column.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from genesys_dice.dice import Dice, DiceCounts, DicePool, Modifier
+from genesys_dice.moments import pool_moments
+from genesys_dice.probability import (
+    Histogram,
+    net_success_histogram,
+    positive_count,
+)
+
+DIFFICULTIES = [
+    ("Easy", 1),
+    ("Average", 2),
+    ("Hard", 3),
+    ("Daunting", 4),
+    ("Formidable", 5),
+]
+
+GRID_CHARACTERISTICS = range(1, 6)
+GRID_SKILLS = range(0, 6)
+GRID_UPGRADES = range(0, 4)
+
+
+def check_pool(characteristic: int, skill: int) -> DicePool:
+    """
+    The larger of characteristic and skill in ability dice, with the
+    smaller number of them upgraded to proficiency.
+    """
+    pool = DicePool(Dice.ABILITY.short_code * max(characteristic, skill))
+
+    for _ in range(min(characteristic, skill)):
+        pool.modify(Dice.ABILITY, Modifier.UPGRADE)
+
+    return pool
+
+
+def difficulty_pool(difficulty: int, upgrades: int = 0) -> DicePool:
+    pool = DicePool(Dice.DIFFICULTY.short_code * difficulty)
+
+    for _ in range(upgrades):
+        pool.modify(Dice.DIFFICULTY, Modifier.UPGRADE)
+
+    return pool
+
+
+def mean_net_advantage(pool: DicePool) -> float:
+    return pool_moments(pool.dice_counts).advantage.mean
+
+
+@dataclass
+class GridRow:
+    characteristic: int
+    skill: int
+    pool: DicePool
+
+
+@dataclass
+class GridColumn:
+    difficulty: str
+    upgrades: int
+    pool: DicePool
+
+    @property
+    def label(self) -> str:
+        return self.difficulty + (f" +{self.upgrades}" if self.upgrades > 0 else "")
+
+
+@dataclass
+class Grid:
+    """
+    success[i][j] is the success rate (in %) of rows[i] against columns[j],
+    and advantage[i][j] the expected net advantage, if it was computed.
+    """
+
+    rows: List[GridRow]
+    columns: List[GridColumn]
+    success: List[List[float]] = field(default_factory=list)
+    advantage: Optional[List[List[float]]] = None
+
+    def records(self) -> List[Dict[str, Any]]:
+        records = []
+
+        for i, row in enumerate(self.rows):
+            for j, column in enumerate(self.columns):
+                record: Dict[str, Any] = {
+                    "characteristic": row.characteristic,
+                    "skill": row.skill,
+                    "difficulty": column.difficulty,
+                    "upgrades": column.upgrades,
+                    "dice": row.pool.dice + column.pool.dice,
+                    "success": self.success[i][j],
+                }
+                if self.advantage is not None:
+                    record["advantage"] = self.advantage[i][j]
+                records.append(record)
+
+        return records
+
+
+def odds_grid(
+    characteristics: Sequence[int] = GRID_CHARACTERISTICS,
+    skills: Sequence[int] = GRID_SKILLS,
+    difficulties: Sequence[Tuple[str, int]] = DIFFICULTIES,
+    upgrades: Sequence[int] = GRID_UPGRADES,
+    advantage: bool = False,
+) -> Grid:
+    rows = [
+        GridRow(characteristic, skill, check_pool(characteristic, skill))
+        for characteristic in characteristics
+        for skill in skills
+    ]
+    columns = [
+        GridColumn(name, upgrade, difficulty_pool(count, upgrade))
+        for name, count in difficulties
+        for upgrade in upgrades
+    ]
+    grid = Grid(rows, columns)
+    row_histograms = [net_success_histogram(row.pool.dice_counts) for row in rows]
+    column_histograms = [
+        net_success_histogram(column.pool.dice_counts) for column in columns
+    ]
+    cells: Dict[Tuple[DiceCounts, DiceCounts], float] = {}
+
+    def success(i: int, j: int) -> float:
+        # Rows (and columns) with the same dice share a result
+        key = (rows[i].pool.dice_counts, columns[j].pool.dice_counts)
+        if key not in cells:
+            cells[key] = _success_rate(row_histograms[i], column_histograms[j])
+        return cells[key]
+
+    grid.success = [
+        [success(i, j) for j in range(len(columns))] for i in range(len(rows))
+    ]
+
+    if advantage:
+        row_means = [mean_net_advantage(row.pool) for row in rows]
+        column_means = [mean_net_advantage(column.pool) for column in columns]
+        grid.advantage = [[round(r + c, 2) for c in column_means] for r in row_means]
+
+    return grid
+
+
+def _success_rate(positive: Histogram, negative: Histogram) -> float:
+    total = sum(positive.values()) * sum(negative.values())
+    return round(positive_count(positive, negative) / total * 100, 2)
@@ -0,0 +1,347 @@
+"""
+Importance-sampling estimates of the chance of rare outcomes, such as 3
+or more triumphs and no despair, for pools too large to enumerate.
+
+Rolls are drawn from a proposal that weights each die type's faces
+toward the condition, and each roll is weighted by its likelihood ratio,
+the chance of its faces under fair dice over their chance under the
+proposal.  The proposal is found by the cross-entropy method: each level
+draws a pilot sample, keeps the rolls that come closest to meeting the
+condition, and refits every die type's face probabilities to the faces of
+those rolls, until at least ELITE_FRACTION of a pilot meets it.
+
+How close a roll comes is a score compiled from the condition (see
+compile_score): 0 if the condition holds, otherwise minus how far each
+comparison is from holding.  Dice of one type are exchangeable, so a
+roll is drawn as the number of each face of each die type, one
+multinomial per die type, and takes the same time for any number of dice.
+"""
+
+import ast
+from dataclasses import dataclass
+from functools import lru_cache
+import math
+from statistics import NormalDist
+from typing import Callable, Dict, List, Mapping, Optional, Tuple, cast
+
+import numpy as np
+
+from genesys_dice.dice import Dice
+from genesys_dice.query import (
+    PERCENTILE_VARIABLE,
+    Columns,
+    compile_expression,
+)
+from genesys_dice.sampling import outcome_table
+
+IMPORTANCE_SAMPLES = 20_000
+PILOT_SAMPLES = 2_000
+ELITE_FRACTION = 0.1
+MAX_LEVELS = 50
+STALLED_LEVELS = 5
+"""
+Levels without getting any closer to the condition before giving up on
+it, as for a condition the pool can't meet.
+"""
+
+SMOOTHING = 0.7
+"""
+Weight of the refitted face probabilities against the previous ones at
+each level, so that a face missing from one pilot isn't ruled out.
+"""
+
+MIN_FACE_PROBABILITY = 1e-4
+"""
+Every face keeps at least this chance, so that no roll of the fair dice
+is impossible under the proposal.
+"""
+
+Score = Callable[[Columns], np.ndarray]
+Proposal = Dict[Dice, np.ndarray]
+
+NEGATED_COMPARISONS: Dict[type, type] = {
+    ast.Eq: ast.NotEq,
+    ast.NotEq: ast.Eq,
+    ast.Lt: ast.GtE,
+    ast.GtE: ast.Lt,
+    ast.LtE: ast.Gt,
+    ast.Gt: ast.LtE,
+}
+
+
+def _comparison_score(op: ast.cmpop, difference: np.ndarray) -> np.ndarray:
+    """
+    0 where left op right holds, given difference = left - right, and
+    negative elsewhere, further below 0 the further from holding.
+    """
+    match op:
+        case ast.Eq():
+            return np.where(difference == 0, 0.0, -np.abs(difference))
+        case ast.NotEq():
+            return np.where(difference != 0, 0.0, -1.0)
+        case ast.Lt():
+            return np.where(difference < 0, 0.0, -difference - 1)
+        case ast.LtE():
+            return np.where(difference <= 0, 0.0, -difference)
+        case ast.Gt():
+            return np.where(difference > 0, 0.0, difference - 1)
+        case ast.GtE():
+            return np.where(difference >= 0, 0.0, difference)
+        case _:
+            raise Exception(f"Unsupported comparison: {ast.dump(op)}")
+
+
+def _compile_score(node: ast.AST, negate: bool = False) -> Score:
+    match node:
+        case ast.UnaryOp(op=ast.Not(), operand=operand):
+            return _compile_score(operand, not negate)
+        case ast.BoolOp(op=op, values=values):
+            parts = [_compile_score(value, negate) for value in values]
+            # not (a and b) is (not a) or (not b), and vice versa
+            conjunction = isinstance(op, ast.And) != negate
+
+            def boolean(columns: Columns) -> np.ndarray:
+                scores = [part(columns) for part in parts]
+                combine = np.sum if conjunction else np.max
+                return np.asarray(combine(scores, axis=0))
+
+            return boolean
+        case ast.Compare(left=left, ops=ops, comparators=comparators):
+            terms = [left, *comparators]
+            pairs = [
+                (
+                    NEGATED_COMPARISONS[type(op)]() if negate else op,
+                    compile_expression(ast.unparse(a)),
+                    compile_expression(ast.unparse(b)),
+                )
+                for op, a, b in zip(ops, terms, terms[1:])
+            ]
+
+            def compare(columns: Columns) -> np.ndarray:
+                scores = [
+                    _comparison_score(op, np.asarray(a(columns) - b(columns)))
+                    for op, a, b in pairs
+                ]
+                # A negated chain holds if any of its comparisons fails
+                combine = np.max if negate else np.sum
+                return np.asarray(combine(scores, axis=0))
+
+            return compare
+        case _:
+            # Anything else is true when it's nonzero
+            value = compile_expression(ast.unparse(node))
+            truth: ast.cmpop = ast.Eq() if negate else ast.NotEq()
+            return lambda columns: _comparison_score(truth, np.asarray(value(columns)))
+
+
+@lru_cache(maxsize=256)
+def compile_score(condition: str) -> Score:
+    """
+    A score for every roll that is 0 where the condition holds, and
+    negative elsewhere: each comparison counts how far its two sides are
+    from meeting it, and these add up over "and" and take the best over
+    "or".  "not" is pushed down to the comparisons.
+    """
+    try:
+        tree = ast.parse(condition, mode="eval")
+    except SyntaxError:
+        raise Exception(f"Invalid condition: {condition}")
+
+    return _compile_score(tree.body)
+
+
+def face_values(die_type: Dice) -> np.ndarray:
+    """
+    One row per face: net success, net advantage, triumph, despair and
+    percentile.
+    """
+    if die_type is Dice.PERCENTILE:
+        values = np.zeros((len(die_type.faces), 5), dtype=np.int64)
+        values[:, 4] = [cast(int, face) for face in die_type.faces]
+        return values
+
+    table = outcome_table(die_type).astype(np.int64)
+    return np.hstack([table, np.zeros((len(table), 1), dtype=np.int64)])
+
+
+class Sample:
+    """
+    n rolls of a pool from a proposal: the count of each face of each die
+    type, the outcome columns, and the log likelihood ratio of each roll.
+    """
+
+    def __init__(
+        self,
+        dice_counts: Mapping[Dice, int],
+        proposal: Proposal,
+        n: int,
+        rng: np.random.Generator,
+    ) -> None:
+        self.faces: Dict[Dice, np.ndarray] = {}
+        totals = np.zeros((n, 5), dtype=np.int64)
+        self.log_ratios = np.zeros(n)
+
+        for die_type, count in dice_counts.items():
+            if count == 0:
+                continue
+
+            probabilities = proposal[die_type]
+            faces = rng.multinomial(count, probabilities, size=n)
+            self.faces[die_type] = faces
+            totals += faces @ face_values(die_type)
+            fair = -math.log(len(probabilities))
+            self.log_ratios += faces @ (fair - np.log(probabilities))
+
+        self.columns: Columns = {
+            "success": totals[:, 0],
+            "advantage": totals[:, 1],
+            "triumph": totals[:, 2],
+            "despair": totals[:, 3],
+            "failure": np.maximum(-totals[:, 0], 0),
+            "threat": np.maximum(-totals[:, 1], 0),
+            PERCENTILE_VARIABLE: totals[:, 4],
+        }
+
+
+def fair_proposal(dice_counts: Mapping[Dice, int]) -> Proposal:
+    return {
+        die_type: np.full(len(die_type.faces), 1 / len(die_type.faces))
+        for die_type, count in dice_counts.items()
+        if count > 0
+    }
+
+
+def refit(
+    proposal: Proposal,
+    dice_counts: Mapping[Dice, int],
+    sample: Sample,
+    elite: np.ndarray,
+) -> Proposal:
+    """
+    Each die type's face frequencies over the elite rolls, weighted by
+    their likelihood ratios, smoothed towards the previous proposal.
+    """
+    log_ratios = sample.log_ratios[elite]
+    weights = np.exp(log_ratios - log_ratios.max())
+    refitted: Proposal = {}
+
+    for die_type, previous in proposal.items():
+        frequencies = weights @ sample.faces[die_type][elite]
+        frequencies = frequencies / (weights.sum() * dice_counts[die_type])
+        probabilities = SMOOTHING * frequencies + (1 - SMOOTHING) * previous
+        probabilities = np.maximum(probabilities, MIN_FACE_PROBABILITY)
+        refitted[die_type] = probabilities / probabilities.sum()
+
+    return refitted
+
+
+def fit_proposal(
+    dice_counts: Mapping[Dice, int],
+    condition: str,
+    rng: np.random.Generator,
+    pilot_samples: int = PILOT_SAMPLES,
+) -> Tuple[Proposal, int]:
+    """
+    The cross-entropy proposal for the condition, and the number of
+    levels it took.
+    """
+    score = compile_score(condition)
+    proposal = fair_proposal(dice_counts)
+    best, stalled = -math.inf, 0
+
+    for level in range(1, MAX_LEVELS + 1):
+        sample = Sample(dice_counts, proposal, pilot_samples, rng)
+        scores = np.broadcast_to(score(sample.columns), (pilot_samples,))
+        threshold = min(float(np.quantile(scores, 1 - ELITE_FRACTION)), 0.0)
+        proposal = refit(proposal, dice_counts, sample, scores >= threshold)
+
+        if threshold == 0:
+            return proposal, level
+
+        best, stalled = (threshold, 0) if threshold > best else (best, stalled + 1)
+        if stalled == STALLED_LEVELS:
+            return proposal, level
+
+    return proposal, MAX_LEVELS
+
+
+@dataclass
+class RareEstimate:
+    """
+    An importance-sampling estimate, with its standard error relative to
+    the estimate (infinite if no roll met the condition).
+    """
+
+    probability: float
+    relative_error: float
+    samples: int
+    levels: int
+
+    def interval(self, confidence: float = 0.95) -> Tuple[float, float]:
+        if self.probability == 0:
+            return 0.0, 0.0
+
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+        spread = z * self.relative_error * self.probability
+        return max(self.probability - spread, 0.0), self.probability + spread
+
+    def __str__(self) -> str:
+        if self.probability == 0:
+            return f"0% (no roll met it in {self.samples} samples)"
+
+        return (
+            f"{self.probability * 100:.3g}% "
+            f"(± {self.relative_error * 100:.2g}% relative, {self.samples} samples)"
+        )
+
+
+def _estimate(
+    dice_counts: Mapping[Dice, int],
+    condition: str,
+    samples: int,
+    rng: np.random.Generator,
+) -> RareEstimate:
+    proposal, levels = fit_proposal(dice_counts, condition, rng)
+    sample = Sample(dice_counts, proposal, samples, rng)
+    matches = compile_expression(condition)(sample.columns)
+    matches = np.broadcast_to(matches, (samples,)).astype(bool)
+
+    weighted = np.where(matches, np.exp(sample.log_ratios), 0.0)
+    probability = float(weighted.mean())
+    if probability == 0:
+        return RareEstimate(0.0, math.inf, samples, levels)
+
+    error = float(weighted.std(ddof=1)) / math.sqrt(samples)
+    return RareEstimate(probability, error / probability, samples, levels)
+
+
+def importance_probability(
+    dice_counts: Mapping[Dice, int],
+    condition: str,
+    given: Optional[str] = None,
+    samples: int = IMPORTANCE_SAMPLES,
+    seed: Optional[int] = None,
+) -> RareEstimate:
+    """
+    P(condition), or P(condition | given) as the ratio of two estimates.
+    Reproducible given a seed.
+    """
+    rng = np.random.default_rng(seed)
+
+    if given is None:
+        return _estimate(dice_counts, condition, samples, rng)
+
+    estimates: List[RareEstimate] = [
+        _estimate(dice_counts, f"({condition}) and ({given})", samples, rng),
+        _estimate(dice_counts, given, samples, rng),
+    ]
+    joint, marginal = estimates
+    if marginal.probability == 0:
+        return RareEstimate(0.0, math.inf, samples, marginal.levels)
+
+    return RareEstimate(
+        joint.probability / marginal.probability,
+        math.hypot(joint.relative_error, marginal.relative_error),
+        samples,
+        max(joint.levels, marginal.levels),
+    )
@@ -0,0 +1,266 @@
+"""
+A precomputed, memory-mapped table of odds for the pools that come up at
+the table: up to LOOKUP_MAX_COUNT of each positive die against up to
+LOOKUP_MAX_COUNT of each negative die.
+
+The file is a fixed-size header followed by one fixed-stride record per
+pool, so a lookup is a single offset computation and read.  The header
+records a digest of the face tables, and a table built from different
+faces is ignored.
+"""
+
+from functools import cache
+import hashlib
+import itertools
+import mmap
+import os
+import struct
+import tempfile
+from typing import Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+from genesys_dice.data import PLATFORM_DIRS
+from genesys_dice.dice import Dice
+from genesys_dice.probability import (
+    Histogram,
+    convolve,
+    net_success_histogram,
+    positive_count,
+)
+
+LOOKUP_FILE_NAME = "genesys-dice-odds.bin"
+LOOKUP_MAGIC = b"GDLT"
+LOOKUP_FORMAT_VERSION = 1
+LOOKUP_MAX_COUNT = 6
+
+LOOKUP_LAYOUT = [
+    Dice.BOOST,
+    Dice.ABILITY,
+    Dice.PROFICIENCY,
+    Dice.SETBACK,
+    Dice.DIFFICULTY,
+    Dice.CHALLENGE,
+]
+"""
+Order of the counts in the record index; the first half are the positive
+dice, the second half the negative dice.
+"""
+
+HEADER = struct.Struct("<4sHBB32s")
+RECORD = struct.Struct("<6d")
+
+
+class LookupRecord(NamedTuple):
+    """
+    Probabilities are in [0, 1]; net_success and net_advantage are
+    expected values.
+    """
+
+    success: float
+    net_success: float
+    net_advantage: float
+    advantage: float
+    triumph: float
+    despair: float
+
+
+def faces_digest() -> bytes:
+    """
+    Digest of every face table the lookup table depends on.
+    """
+    tables = [(die_type.value, die_type.table) for die_type in LOOKUP_LAYOUT]
+    return hashlib.sha256(repr(tables).encode()).digest()
+
+
+def record_index(counts: Tuple[int, ...], max_count: int) -> int:
+    index = 0
+
+    for count in reversed(counts):
+        index = index * (max_count + 1) + count
+
+    return index
+
+
+def default_table_path() -> str:
+    return os.path.join(PLATFORM_DIRS.user_cache_dir, LOOKUP_FILE_NAME)
+
+
+class LookupTable:
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            self.max_count: int = self.check_header(path)
+        except Exception:
+            self.buffer.close()
+            raise
+
+    def check_header(self, path: str) -> int:
+        """
+        The table's max_count, once the header and the file's size are
+        known to be right.
+        """
+        if len(self.buffer) < HEADER.size:
+            raise Exception(f"{path} is not a genesys-dice lookup table")
+
+        magic, version, max_count, field_count, digest = HEADER.unpack_from(self.buffer)
+
+        if magic != LOOKUP_MAGIC or version != LOOKUP_FORMAT_VERSION:
+            raise Exception(f"{path} is not a genesys-dice lookup table")
+        if field_count != len(LookupRecord._fields):
+            raise Exception(f"{path} has {field_count} fields per record")
+        if digest != faces_digest():
+            raise Exception(f"{path} was built from different dice faces")
+
+        size = HEADER.size + RECORD.size * (max_count + 1) ** len(LOOKUP_LAYOUT)
+        if len(self.buffer) != size:
+            raise Exception(f"{path} is {len(self.buffer)} bytes, not {size}")
+
+        return int(max_count)
+
+    def get(self, dice_counts: Mapping[Dice, int]) -> Optional[LookupRecord]:
+        counts = tuple(dice_counts.get(die_type, 0) for die_type in LOOKUP_LAYOUT)
+
+        if any(count > self.max_count for count in counts):
+            return None
+
+        offset = HEADER.size + RECORD.size * record_index(counts, self.max_count)
+
+        return LookupRecord(*RECORD.unpack_from(self.buffer, offset))
+
+    def close(self) -> None:
+        self.buffer.close()
+
+
+@cache
+def get_lookup_table(path: Optional[str] = None) -> Optional[LookupTable]:
+    """
+    The lookup table at path (or the default location), or None if there
+    isn't a valid one.
+    """
+    try:
+        return LookupTable(path or default_table_path())
+    except Exception:
+        return None
+
+
+def lookup(dice_counts: Mapping[Dice, int]) -> Optional[LookupRecord]:
+    table = get_lookup_table()
+    return table.get(dice_counts) if table is not None else None
+
+
+def _net_advantage_histogram(dice_counts: Mapping[Dice, int]) -> Histogram:
+    histogram: Histogram = {0: 1}
+
+    for die_type, count in dice_counts.items():
+        die_histogram: Histogram = {}
+        for vector in die_type.table:
+            value = vector.net_advantage
+            die_histogram[value] = die_histogram.get(value, 0) + 1
+        for _ in range(count):
+            histogram = convolve(histogram, die_histogram)
+
+    return histogram
+
+
+def _side_histograms(
+    side: List[Dice], max_count: int
+) -> Dict[Tuple[int, ...], Tuple[Histogram, Histogram]]:
+    histograms = {}
+
+    for counts in itertools.product(range(max_count + 1), repeat=len(side)):
+        dice_counts = dict(zip(side, counts))
+        histograms[counts] = (
+            net_success_histogram(dice_counts),
+            _net_advantage_histogram(dice_counts),
+        )
+
+    return histograms
+
+
+def _die_stats(die_type: Dice) -> Tuple[float, float, float, float]:
+    """
+    Mean net success, mean net advantage, and the chances of no triumph and
+    of no despair on a single die.
+    """
+    table = die_type.table
+    faces = len(table)
+
+    return (
+        sum(v.net_success for v in table) / faces,
+        sum(v.net_advantage for v in table) / faces,
+        sum(1 for v in table if v.triumph == 0) / faces,
+        sum(1 for v in table if v.despair == 0) / faces,
+    )
+
+
+def build_lookup_table(
+    path: Optional[str] = None, max_count: int = LOOKUP_MAX_COUNT
+) -> str:
+    """
+    Compute every record exactly and write the table to path (or the
+    default location).  The positive and negative halves of each pool are
+    computed once and combined per record.
+    """
+    path = path or default_table_path()
+    half = len(LOOKUP_LAYOUT) // 2
+    positive = _side_histograms(LOOKUP_LAYOUT[:half], max_count)
+    negative = _side_histograms(LOOKUP_LAYOUT[half:], max_count)
+    stats = {die_type: _die_stats(die_type) for die_type in LOOKUP_LAYOUT}
+    records = bytearray(RECORD.size * (max_count + 1) ** len(LOOKUP_LAYOUT))
+
+    for counts in itertools.product(range(max_count + 1), repeat=len(LOOKUP_LAYOUT)):
+        positive_success, positive_advantage = positive[counts[:half]]
+        negative_success, negative_advantage = negative[counts[half:]]
+        total = sum(positive_success.values()) * sum(negative_success.values())
+        no_triumph = 1.0
+        no_despair = 1.0
+        net_success = 0.0
+        net_advantage = 0.0
+
+        for die_type, count in zip(LOOKUP_LAYOUT, counts):
+            mean_success, mean_advantage, die_no_triumph, die_no_despair = stats[
+                die_type
+            ]
+            net_success += mean_success * count
+            net_advantage += mean_advantage * count
+            no_triumph *= die_no_triumph**count
+            no_despair *= die_no_despair**count
+
+        record = LookupRecord(
+            success=positive_count(positive_success, negative_success) / total,
+            net_success=net_success,
+            net_advantage=net_advantage,
+            advantage=positive_count(positive_advantage, negative_advantage) / total,
+            triumph=1 - no_triumph,
+            despair=1 - no_despair,
+        )
+        RECORD.pack_into(
+            records, RECORD.size * record_index(counts, max_count), *record
+        )
+
+    # Written beside the table and moved into place, so an interrupted
+    # build never leaves a partial table behind
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+            file.write(
+                HEADER.pack(
+                    LOOKUP_MAGIC,
+                    LOOKUP_FORMAT_VERSION,
+                    max_count,
+                    len(LookupRecord._fields),
+                    faces_digest(),
+                )
+            )
+            file.write(records)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+    get_lookup_table.cache_clear()
+
+    return path
@@ -0,0 +1,120 @@
+"""
+Mean, variance and skewness of a pool's net symbols, without building any
+distribution.
+
+Dice are independent, so the cumulants of a sum are the sums of the
+dice's cumulants: each die type's face table is reduced once to its mean
+and second and third central moments, and a pool's moments take one step
+per die type, however many dice it has.
+"""
+
+from dataclasses import dataclass
+from functools import cache
+import math
+from typing import List, Mapping, NamedTuple, Sequence, cast
+
+from genesys_dice.dice import Dice, Symbol
+
+QUANTITIES = ["success", "advantage", "triumph", "despair", "percentile"]
+"""
+success and advantage are net values, as in a Result; percentile is the
+sum of the percentile dice.
+"""
+
+
+class Moments(NamedTuple):
+    """
+    Mean, variance and third central moment (which, like the mean and
+    variance, adds up over independent dice).
+    """
+
+    mean: float = 0.0
+    variance: float = 0.0
+    third: float = 0.0
+
+    @property
+    def deviation(self) -> float:
+        return math.sqrt(self.variance)
+
+    @property
+    def skewness(self) -> float:
+        if self.variance == 0:
+            return 0.0
+
+        return self.third / math.pow(self.variance, 1.5)
+
+    def scale(self, count: int) -> "Moments":
+        """
+        Moments of the sum of count independent copies.
+        """
+        return Moments(*(count * value for value in self))
+
+    def add(self, other: "Moments") -> "Moments":
+        return Moments(*(a + b for a, b in zip(self, other)))
+
+
+def moments_of(values: Sequence[float]) -> Moments:
+    """
+    Moments of a value drawn uniformly from values.
+    """
+    mean = sum(values) / len(values)
+    variance = sum((v - mean) ** 2 for v in values) / len(values)
+    third = sum((v - mean) ** 3 for v in values) / len(values)
+
+    return Moments(mean, variance, third)
+
+
+@cache
+def die_moments(die_type: Dice) -> List[Moments]:
+    """
+    Moments of each of QUANTITIES for a single die, from its face tables.
+    """
+    if die_type is Dice.PERCENTILE:
+        percentile = moments_of([cast(int, face) for face in die_type.faces])
+        return [Moments()] * 4 + [percentile]
+
+    columns = zip(*die_type.die.nets)
+
+    return [moments_of(column) for column in columns] + [Moments()]
+
+
+@dataclass
+class PoolMoments:
+    success: Moments
+    advantage: Moments
+    triumph: Moments
+    despair: Moments
+    percentile: Moments
+
+    def __str__(self) -> str:
+        parts = [
+            f"{symbol.unicode} {moments.mean:.2f}±{moments.deviation:.2f}"
+            for symbol, moments in [
+                (Symbol.SUCCESS, self.success),
+                (Symbol.ADVANTAGE, self.advantage),
+                (Symbol.TRIUMPH, self.triumph),
+                (Symbol.DESPAIR, self.despair),
+            ]
+            if moments != Moments()
+        ]
+        if self.percentile != Moments():
+            parts.append(
+                f"% {self.percentile.mean:.1f}±{self.percentile.deviation:.1f}"
+            )
+
+        return "  ".join(parts)
+
+
+def pool_moments(dice_counts: Mapping[Dice, int]) -> PoolMoments:
+    totals = [Moments()] * len(QUANTITIES)
+
+    for die_type, count in dice_counts.items():
+        if count == 0:
+            continue
+
+        totals = [
+            total.add(moments.scale(count))
+            for total, moments in zip(totals, die_moments(die_type))
+        ]
+
+    return PoolMoments(*totals)
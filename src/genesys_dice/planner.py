@@ -0,0 +1,307 @@
+"""
+Pick the fastest engine that can answer a pool's success rate to a
+requested accuracy within a wall-clock budget.
+
+Every strategy in STRATEGIES estimates, from the pool's dice and face
+tables alone, how long it would take and how far from the true success
+rate its answer could be: 0 for the exact engines, the Berry-Esseen bound
+for the approximations, and the 95% interval for Monte Carlo, which draws
+as many rolls as the accuracy needs or the budget allows.  The planner
+runs the cheapest strategy that meets the accuracy inside the budget, or
+if none does, the most accurate one that fits.
+
+The costs are rough per-operation timings, so the budget is a target
+rather than a deadline, but they are good enough to tell a pool that
+takes a millisecond from one that would take an hour.
+"""
+
+import itertools
+import math
+from statistics import NormalDist
+import time
+from typing import Callable, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+from genesys_dice.approximation import (
+    approximate_success,
+    error_bound,
+    symbol_dice_count,
+)
+from genesys_dice.dice import Dice
+from genesys_dice.lookup import lookup
+from genesys_dice.probability import (
+    SYMBOL_DICE,
+    die_net_success_histogram,
+    success_fraction,
+    symbol_dice,
+)
+from genesys_dice.sampling import estimate_success_probability
+
+DEFAULT_ACCURACY = 0.005
+"""
+Largest acceptable error in the success rate, as a probability.
+"""
+
+DEFAULT_BUDGET = 2.0
+INTERACTIVE_BUDGET = 0.1
+"""
+Seconds to spend on the odds shown in the TUI, which are computed while
+the user waits.
+"""
+
+LOOKUP_SECONDS = 1e-5
+BRUTE_FORCE_SECONDS = 1.5e-7
+"""
+Per die per face combination.
+"""
+
+EXACT_SECONDS = (1e-4, 7e-9)
+"""
+Overhead, and per multiply-add of histogram counts per die in the pool,
+since the counts grow into big integers about as long as the pool.
+"""
+
+APPROXIMATION_SECONDS = 1e-3
+MONTE_CARLO_SECONDS = (1e-3, 9e-8)
+"""
+Overhead, and per die per roll.
+"""
+
+MONTE_CARLO_MIN_SAMPLES = 1_000
+MONTE_CARLO_CONFIDENCE = 0.95
+
+
+class Answer(NamedTuple):
+    """
+    A success rate (as a probability), how far from the true rate it can
+    be, the engine that computed it, and how long that took in seconds.
+    """
+
+    probability: float
+    error: float
+    engine: str
+    seconds: float
+
+    @property
+    def percent(self) -> float:
+        return round(self.probability * 100, 2)
+
+    def details(self) -> str:
+        elapsed = f"{self.seconds * 1000:.1f} ms"
+        if self.error == 0:
+            return f"{self.engine}, {elapsed}"
+
+        return f"± {round(self.error * 100, 2)}%, {self.engine}, {elapsed}"
+
+    def __str__(self) -> str:
+        return f"{self.percent}% ({self.details()})"
+
+
+class Plan(NamedTuple):
+    """
+    A strategy's estimated seconds and error for one pool, and how to run
+    it, returning the success rate and its error.
+    """
+
+    engine: str
+    seconds: float
+    error: float
+    run: Callable[[], Tuple[float, float]]
+
+
+Strategy = Callable[[Mapping[Dice, int], float, float], Optional[Plan]]
+
+
+def convolution_steps(dice_counts: Mapping[Dice, int]) -> float:
+    """
+    Multiply-adds to build the pool's net success histogram: repeated
+    squaring for each die type, about a third of its span squared, then
+    convolving it into the die types before it.
+    """
+    steps = 0.0
+    prefix = 0
+
+    for die_type, count in symbol_dice(dice_counts).items():
+        histogram = die_net_success_histogram(die_type)
+        span = count * (max(histogram) - min(histogram))
+        steps += span**2 / 3 + prefix * span
+        prefix += span
+
+    return steps
+
+
+def brute_force_success(dice_counts: Mapping[Dice, int]) -> float:
+    """
+    Enumerate every combination of faces, summing their net successes.
+    """
+    nets = [
+        [vector.net_success for vector in die_type.table]
+        for die_type in SYMBOL_DICE
+        for _ in range(dice_counts.get(die_type, 0))
+    ]
+    combinations = math.prod(len(die) for die in nets)
+    successes = sum(1 for faces in itertools.product(*nets) if sum(faces) > 0)
+
+    return successes / combinations
+
+
+def plan_lookup(
+    dice_counts: Mapping[Dice, int], accuracy: float, budget: float
+) -> Optional[Plan]:
+    record = lookup(dice_counts)
+    if record is None:
+        return None
+
+    return Plan("lookup", LOOKUP_SECONDS, 0.0, lambda: (record.success, 0.0))
+
+
+def plan_brute_force(
+    dice_counts: Mapping[Dice, int], accuracy: float, budget: float
+) -> Optional[Plan]:
+    dice = symbol_dice_count(dice_counts)
+    # In logs, since the combinations of a large pool overflow a float
+    log_combinations = sum(
+        count * math.log(len(die_type.table))
+        for die_type, count in symbol_dice(dice_counts).items()
+    )
+    seconds = BRUTE_FORCE_SECONDS * max(dice, 1) * math.exp(min(log_combinations, 700))
+
+    return Plan(
+        "brute-force",
+        seconds,
+        0.0,
+        lambda: (brute_force_success(dice_counts), 0.0),
+    )
+
+
+def plan_exact(
+    dice_counts: Mapping[Dice, int], accuracy: float, budget: float
+) -> Optional[Plan]:
+    overhead, per_step = EXACT_SECONDS
+    steps = convolution_steps(dice_counts) * symbol_dice_count(dice_counts)
+
+    return Plan(
+        "exact",
+        overhead + per_step * steps,
+        0.0,
+        lambda: (success_fraction(dice_counts), 0.0),
+    )
+
+
+def plan_approximation(method: str) -> Strategy:
+    def plan(
+        dice_counts: Mapping[Dice, int], accuracy: float, budget: float
+    ) -> Optional[Plan]:
+        def run() -> Tuple[float, float]:
+            approximation = approximate_success(dice_counts, method)
+            return approximation.probability, approximation.error_bound
+
+        # The saddlepoint's bound also adds its distance from the normal
+        # approximation, which is only known once it's run
+        return Plan(method, APPROXIMATION_SECONDS, error_bound(dice_counts), run)
+
+    return plan
+
+
+def plan_monte_carlo(
+    dice_counts: Mapping[Dice, int], accuracy: float, budget: float
+) -> Optional[Plan]:
+    """
+    As many rolls as the accuracy needs at the worst case p = 0.5, or as
+    the budget allows if that's fewer.
+    """
+    z = NormalDist().inv_cdf((1 + MONTE_CARLO_CONFIDENCE) / 2)
+    overhead, per_die = MONTE_CARLO_SECONDS
+    per_roll = per_die * max(symbol_dice_count(dice_counts), 1)
+
+    needed = math.ceil((z / (2 * accuracy)) ** 2) if accuracy > 0 else math.inf
+    affordable = math.floor(max(budget - overhead, 0) / per_roll)
+    samples = int(max(min(needed, affordable), MONTE_CARLO_MIN_SAMPLES))
+
+    def run() -> Tuple[float, float]:
+        estimate = estimate_success_probability(
+            dice_counts, samples=samples, confidence=MONTE_CARLO_CONFIDENCE
+        )
+        return estimate.probability, estimate.half_width()
+
+    return Plan(
+        "monte-carlo",
+        overhead + per_roll * samples,
+        z / (2 * math.sqrt(samples)),
+        run,
+    )
+
+
+STRATEGIES: Dict[str, Strategy] = {
+    "lookup": plan_lookup,
+    "brute-force": plan_brute_force,
+    "exact": plan_exact,
+    "normal": plan_approximation("normal"),
+    "saddlepoint": plan_approximation("saddlepoint"),
+    "monte-carlo": plan_monte_carlo,
+}
+
+
+def plans(
+    dice_counts: Mapping[Dice, int],
+    accuracy: float = DEFAULT_ACCURACY,
+    budget: float = DEFAULT_BUDGET,
+) -> List[Plan]:
+    """
+    Every strategy that can answer for the pool, cheapest first.
+    """
+    candidates = [
+        strategy(dice_counts, accuracy, budget) for strategy in STRATEGIES.values()
+    ]
+
+    return sorted(
+        (plan for plan in candidates if plan is not None),
+        key=lambda plan: plan.seconds,
+    )
+
+
+def choose(plans: List[Plan], accuracy: float, budget: float) -> Plan:
+    """
+    The cheapest plan that meets the accuracy within the budget, else the
+    most accurate one within it, else the cheapest.
+    """
+    within = [plan for plan in plans if plan.seconds <= budget]
+    accurate = [plan for plan in within if plan.error <= accuracy]
+
+    if len(accurate) > 0:
+        return accurate[0]
+    if len(within) > 0:
+        return min(within, key=lambda plan: plan.error)
+
+    return plans[0]
+
+
+def success_odds(
+    dice_counts: Mapping[Dice, int],
+    accuracy: Optional[float] = None,
+    budget: Optional[float] = None,
+    engine: Optional[str] = None,
+) -> Answer:
+    """
+    The pool's success rate from the engine the planner chose, or from
+    engine if one of STRATEGIES is named.
+    """
+    if accuracy is None:
+        accuracy = DEFAULT_ACCURACY
+    if budget is None:
+        budget = DEFAULT_BUDGET
+
+    start = time.perf_counter()
+
+    if engine is None:
+        plan = choose(plans(dice_counts, accuracy, budget), accuracy, budget)
+    elif engine in STRATEGIES:
+        forced = STRATEGIES[engine](dice_counts, accuracy, budget)
+        if forced is None:
+            raise Exception(f"The {engine} engine can't answer for this pool")
+        plan = forced
+    else:
+        raise Exception(f"Unknown engine {engine}, expected one of {list(STRATEGIES)}")
+
+    probability, error = plan.run()
+
+    return Answer(probability, error, plan.engine, time.perf_counter() - start)
@@ -0,0 +1,635 @@
+"""
+Exact probability engines for dice pools.
+
+Rather than enumerating every combination of faces, each die type is
+reduced once to a histogram of outcomes, identical dice are combined by
+repeated squaring, and the per-type results are convolved together.
+Distributions are memoized in bounded LRU caches keyed by the pool's die
+counts, including the k-dice histograms of each die type and the
+histograms of pool prefixes.
+
+Joint distributions whose counts would overflow int64 are computed modulo
+several word-sized primes, one independent pass per prime (optionally in a
+process pool), and the exact counts are rebuilt with the Chinese remainder
+theorem.  That's the only part of building a distribution that runs in
+parallel: the passes are few (about one per 30 bits of the count of face
+combinations), and pools that fit in int64 are a single pass.  Rendering
+the rows of a results table can be split across processes too.
+
+Percentile dice are independent of the symbol dice, so they never enter
+the joint distribution: their sum has a histogram of its own (see
+percentile_histogram), and the two are only combined when a question
+needs both.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import cache, lru_cache
+from itertools import repeat
+import math
+import threading
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    cast,
+)
+
+import numpy as np
+
+from genesys_dice.dice import Dice, Result, SymbolVector
+
+Histogram = Dict[int, int]
+
+
+def convolve(a: Histogram, b: Histogram) -> Histogram:
+    result: Histogram = {}
+
+    for a_value, a_count in a.items():
+        for b_value, b_count in b.items():
+            value = a_value + b_value
+            result[value] = result.get(value, 0) + a_count * b_count
+
+    return result
+
+
+SYMBOL_DICE = [die_type for die_type in Dice if die_type is not Dice.PERCENTILE]
+
+PoolKey = Tuple[int, ...]
+
+DISTRIBUTION_CACHE_SIZE = 256
+"""
+Maximum number of entries kept by each of the distribution caches below.
+"""
+
+
+def pool_key(dice_counts: Mapping[Dice, int]) -> PoolKey:
+    """
+    Counts of the symbol dice in SYMBOL_DICE order, without trailing zeros,
+    so that equal pools (and prefixes of pools) share cache entries.
+    """
+    return canonical_key(
+        tuple(dice_counts.get(die_type, 0) for die_type in SYMBOL_DICE)
+    )
+
+
+def canonical_key(key: PoolKey) -> PoolKey:
+    end = len(key)
+
+    while end > 0 and key[end - 1] == 0:
+        end -= 1
+
+    return key[:end]
+
+
+def symbol_dice(dice_counts: Mapping[Dice, int]) -> Dict[Dice, int]:
+    return {
+        die_type: count
+        for die_type, count in dice_counts.items()
+        if count > 0 and die_type is not Dice.PERCENTILE
+    }
+
+
+def die_net_success_histogram(die_type: Dice) -> Histogram:
+    histogram: Histogram = {}
+
+    for vector in die_type.table:
+        value = vector.net_success
+        histogram[value] = histogram.get(value, 0) + 1
+
+    return histogram
+
+
+@lru_cache(maxsize=DISTRIBUTION_CACHE_SIZE)
+def die_net_success_power(die_type: Dice, k: int) -> Histogram:
+    """
+    Net success histogram of k dice of one type, by repeated squaring of
+    the cached k // 2 result.
+    """
+    if k == 0:
+        return {0: 1}
+    if k == 1:
+        return die_net_success_histogram(die_type)
+
+    half = die_net_success_power(die_type, k // 2)
+    histogram = convolve(half, half)
+
+    if k % 2 == 1:
+        histogram = convolve(histogram, die_net_success_histogram(die_type))
+
+    return histogram
+
+
+@lru_cache(maxsize=DISTRIBUTION_CACHE_SIZE)
+def net_success_prefix(key: PoolKey) -> Histogram:
+    if len(key) == 0:
+        return {0: 1}
+
+    return convolve(
+        net_success_prefix(canonical_key(key[:-1])),
+        die_net_success_power(SYMBOL_DICE[len(key) - 1], key[-1]),
+    )
+
+
+def net_success_histogram(dice_counts: Mapping[Dice, int]) -> Histogram:
+    """
+    Number of face combinations for each net success (positive) or
+    failure (negative) value of the pool.  The histogram is cached and
+    shared, so it must not be modified.
+    """
+    return net_success_prefix(pool_key(dice_counts))
+
+
+def positive_count(a: Histogram, b: Histogram) -> int:
+    """
+    Number of combinations of a and b whose values sum to more than zero.
+    """
+    b_values = sorted(b)
+    above: Dict[int, int] = {}
+    running = 0
+
+    for value in reversed(b_values):
+        running += b[value]
+        above[value] = running
+
+    count = 0
+
+    for a_value, a_count in a.items():
+        threshold = next((v for v in b_values if a_value + v > 0), None)
+        if threshold is not None:
+            count += a_count * above[threshold]
+
+    return count
+
+
+def success_fraction(dice_counts: Mapping[Dice, int]) -> float:
+    """
+    Chance, unrounded and in [0, 1], that the pool has net success.
+    """
+    histogram = net_success_histogram(dice_counts)
+    total = sum(histogram.values())
+    success_count = sum(count for value, count in histogram.items() if value > 0)
+
+    return success_count / total
+
+
+def success_probability(dice_counts: Mapping[Dice, int]) -> float:
+    return round(success_fraction(dice_counts) * 100, 2)
+
+
+@lru_cache(maxsize=DISTRIBUTION_CACHE_SIZE)
+def percentile_histogram(count: int) -> Histogram:
+    """
+    Number of ways count percentile dice sum to each value.  A single die
+    is uniform over its faces; no dice always sum to 0.
+    """
+    if count == 0:
+        return {0: 1}
+
+    return convolve(
+        percentile_histogram(count - 1),
+        {cast(int, face): 1 for face in Dice.PERCENTILE.faces},
+    )
+
+
+class Outcome(NamedTuple):
+    """
+    A reduced roll: net success (negative for net failure), net advantage
+    (negative for net threat), and the number of triumphs and despairs.
+    """
+
+    success: int
+    advantage: int
+    triumph: int
+    despair: int
+
+    def shift(self, other: Tuple[int, ...]) -> "Outcome":
+        return Outcome(*(a + b for a, b in zip(self, other)))
+
+
+JointHistogram = Dict[Outcome, int]
+
+NO_OUTCOME = Outcome(0, 0, 0, 0)
+
+TENSOR_BACKEND_THRESHOLD = 8
+"""
+Pools with more symbol dice than this are convolved as numpy tensors.
+"""
+
+
+def vector_outcome(vector: SymbolVector) -> Outcome:
+    return Outcome(
+        vector.net_success, vector.net_advantage, vector.triumph, vector.despair
+    )
+
+
+def die_joint_histogram(die_type: Dice) -> JointHistogram:
+    histogram: JointHistogram = {}
+
+    for vector in die_type.table:
+        outcome = vector_outcome(vector)
+        histogram[outcome] = histogram.get(outcome, 0) + 1
+
+    return histogram
+
+
+def convolve_joint(a: JointHistogram, b: JointHistogram) -> JointHistogram:
+    result: JointHistogram = {}
+
+    for (a_s, a_a, a_t, a_d), a_count in a.items():
+        for (b_s, b_a, b_t, b_d), b_count in b.items():
+            outcome = Outcome(a_s + b_s, a_a + b_a, a_t + b_t, a_d + b_d)
+            result[outcome] = result.get(outcome, 0) + a_count * b_count
+
+    return result
+
+
+@lru_cache(maxsize=DISTRIBUTION_CACHE_SIZE)
+def die_joint_power(die_type: Dice, k: int) -> JointHistogram:
+    """
+    Joint histogram of k dice of one type, by repeated squaring of the
+    cached k // 2 result.
+    """
+    if k == 0:
+        return {NO_OUTCOME: 1}
+    if k == 1:
+        return die_joint_histogram(die_type)
+
+    half = die_joint_power(die_type, k // 2)
+    histogram = convolve_joint(half, half)
+
+    if k % 2 == 1:
+        histogram = convolve_joint(histogram, die_joint_histogram(die_type))
+
+    return histogram
+
+
+@lru_cache(maxsize=DISTRIBUTION_CACHE_SIZE)
+def joint_prefix(key: PoolKey) -> JointHistogram:
+    if len(key) == 0:
+        return {NO_OUTCOME: 1}
+
+    return convolve_joint(
+        joint_prefix(canonical_key(key[:-1])),
+        die_joint_power(SYMBOL_DICE[len(key) - 1], key[-1]),
+    )
+
+
+@dataclass
+class Tensor:
+    """
+    A joint histogram stored densely: index i along each axis is the
+    outcome value origin[axis] + i.
+    """
+
+    counts: np.ndarray
+    origin: Outcome
+
+    @staticmethod
+    def identity(dtype: Any) -> "Tensor":
+        return Tensor(np.ones((1, 1, 1, 1), dtype=dtype), NO_OUTCOME)
+
+    @staticmethod
+    def from_histogram(histogram: JointHistogram, dtype: Any) -> "Tensor":
+        low = Outcome(*(min(axis) for axis in zip(*histogram)))
+        high = Outcome(*(max(axis) for axis in zip(*histogram)))
+        shape = tuple(h - l + 1 for h, l in zip(high, low))
+        counts = np.zeros(shape, dtype=dtype)
+
+        for outcome, count in histogram.items():
+            counts[tuple(o - l for o, l in zip(outcome, low))] = count
+
+        return Tensor(counts, low)
+
+    def convolve(self, kernel: "Tensor") -> "Tensor":
+        """
+        Shift-and-add convolution, looping over the non-zero cells of the
+        (small) kernel and adding a scaled copy of this tensor for each.
+        """
+        shape = tuple(a + b - 1 for a, b in zip(self.counts.shape, kernel.counts.shape))
+        result = np.zeros(shape, dtype=self.counts.dtype)
+
+        for index in zip(*np.nonzero(kernel.counts)):
+            window = tuple(
+                slice(i, i + size) for i, size in zip(index, self.counts.shape)
+            )
+            result[window] += self.counts * kernel.counts[index]
+
+        return Tensor(result, self.origin.shift(kernel.origin))
+
+    def histogram(self) -> JointHistogram:
+        indices = np.nonzero(self.counts)
+        counts = self.counts[indices].tolist()
+        axes = [(axis + low).tolist() for axis, low in zip(indices, self.origin)]
+
+        return {
+            Outcome(s, a, t, d): int(count) for s, a, t, d, count in zip(*axes, counts)
+        }
+
+    @staticmethod
+    def from_residues(residues: Sequence["Tensor"], primes: Sequence[int]) -> "Tensor":
+        """
+        Rebuild the exact counts (as Python ints) from the same tensor
+        computed modulo each of the primes.
+        """
+        modulus = math.prod(primes)
+        shape = residues[0].counts.shape
+        nonzero = np.zeros(shape, dtype=bool)
+
+        for residue in residues:
+            nonzero |= residue.counts != 0
+
+        indices = np.nonzero(nonzero)
+        combined = np.zeros(len(indices[0]), dtype=object)
+
+        for residue, prime in zip(residues, primes):
+            partial = modulus // prime
+            coefficient = partial * pow(partial, -1, prime) % modulus
+            combined += residue.counts[indices].astype(object) * coefficient
+
+        counts = np.zeros(shape, dtype=object)
+        counts[indices] = combined % modulus
+
+        return Tensor(counts, residues[0].origin)
+
+
+@dataclass
+class JointDistribution:
+    """
+    Exact joint distribution of the symbol dice in a pool.  Percentile dice
+    carry no symbols and are left to the caller.
+    """
+
+    counts: JointHistogram
+    total: int
+
+    def success_count(self) -> int:
+        return sum(
+            count for outcome, count in self.counts.items() if outcome.success > 0
+        )
+
+    def success_probability(self) -> float:
+        return round(self.success_count() / self.total * 100, 2)
+
+
+def joint_distribution(
+    dice_counts: Mapping[Dice, int], jobs: int = 1
+) -> JointDistribution:
+    """
+    The distribution is cached and shared, so it must not be modified.
+    With jobs > 1, the residue passes of pools whose counts overflow int64
+    run in that many worker processes.
+    """
+    return cached_joint_distribution(pool_key(dice_counts), jobs)
+
+
+class CacheInfo(NamedTuple):
+    """
+    The counters of lru_cache's cache_info, for a cache of our own.
+    """
+
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class DistributionCache:
+    """
+    Joint distributions by pool, evicting the least recently used.  Not an
+    lru_cache, since jobs changes how a distribution is computed but not
+    what it is, so it mustn't be part of the key.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.entries: "OrderedDict[PoolKey, JointDistribution]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: PoolKey, jobs: int = 1) -> JointDistribution:
+        with self.lock:
+            distribution = self.entries.get(key)
+            if distribution is not None:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return distribution
+            self.misses += 1
+
+        # Like lru_cache, the lock isn't held while computing
+        distribution = compute_joint_distribution(key, jobs)
+
+        with self.lock:
+            self.entries[key] = distribution
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+        return distribution
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self.entries))
+
+    def cache_clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+
+JOINT_DISTRIBUTIONS = DistributionCache(DISTRIBUTION_CACHE_SIZE)
+
+
+def cached_joint_distribution(key: PoolKey, jobs: int = 1) -> JointDistribution:
+    return JOINT_DISTRIBUTIONS.get(key, jobs)
+
+
+def compute_joint_distribution(key: PoolKey, jobs: int = 1) -> JointDistribution:
+    total = 1
+
+    for die_type, count in zip(SYMBOL_DICE, key):
+        total *= len(die_type.faces) ** count
+
+    if sum(key) > TENSOR_BACKEND_THRESHOLD:
+        counts = _tensor_joint_histogram(key, total, jobs)
+    else:
+        counts = joint_prefix(key)
+
+    return JointDistribution(counts, total)
+
+
+RESIDUE_PRIME_LIMIT = 2**31
+"""
+Residues stay below this, so a convolution step (at most 12 cells of at
+most 12 faces each) can't overflow int64.
+"""
+
+
+@cache
+def residue_primes(count: int) -> Tuple[int, ...]:
+    """
+    The count largest primes below RESIDUE_PRIME_LIMIT.
+    """
+    primes: List[int] = []
+    candidate = RESIDUE_PRIME_LIMIT - 1
+
+    while len(primes) < count:
+        if all(
+            candidate % divisor for divisor in range(3, math.isqrt(candidate) + 1, 2)
+        ):
+            primes.append(candidate)
+        candidate -= 2
+
+    return tuple(primes)
+
+
+def residue_tensor(key: PoolKey, prime: Optional[int] = None) -> Tensor:
+    """
+    Tensor of the pool, one die at a time, either exactly in int64 or with
+    every count reduced modulo prime.
+    """
+    tensor = Tensor.identity(np.int64)
+
+    for die_type, count in zip(SYMBOL_DICE, key):
+        if count == 0:
+            continue
+
+        kernel = Tensor.from_histogram(die_joint_histogram(die_type), np.int64)
+        for _ in range(count):
+            tensor = tensor.convolve(kernel)
+            if prime is not None:
+                tensor.counts %= prime
+
+    return tensor
+
+
+def _tensor_joint_histogram(key: PoolKey, total: int, jobs: int = 1) -> JointHistogram:
+    if total < 2**63:
+        return residue_tensor(key).histogram()
+
+    # Counts are below total, so enough primes to exceed it pin them down
+    primes = residue_primes(math.ceil(total.bit_length() / 30))
+
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(primes))) as executor:
+            residues = list(executor.map(residue_tensor, [key] * len(primes), primes))
+    else:
+        residues = [residue_tensor(key, prime) for prime in primes]
+
+    return Tensor.from_residues(residues, primes).histogram()
+
+
+def cache_info() -> Dict[str, Any]:
+    """
+    Hit and miss counters of every distribution cache.
+    """
+    info: Dict[str, Any] = {
+        cache.__name__: cache.cache_info()
+        for cache in [
+            die_net_success_power,
+            net_success_prefix,
+            die_joint_power,
+            joint_prefix,
+            percentile_histogram,
+        ]
+    }
+    info["cached_joint_distribution"] = JOINT_DISTRIBUTIONS.cache_info()
+
+    return info
+
+
+def cache_clear() -> None:
+    die_net_success_power.cache_clear()
+    net_success_prefix.cache_clear()
+    die_joint_power.cache_clear()
+    joint_prefix.cache_clear()
+    JOINT_DISTRIBUTIONS.cache_clear()
+    percentile_histogram.cache_clear()
+
+
+def outcome_str(outcome: Outcome, percentiles: Sequence[int] = ()) -> str:
+    """
+    Render an outcome the same way a rolled Result is rendered.
+    """
+    return str(Result.from_totals(*outcome, percentiles=percentiles))
+
+
+@dataclass
+class ResultsStream:
+    """
+    Rows of a results table, produced lazily in outcome order.
+    """
+
+    rows: Iterator[Tuple[str, float]]
+    success_rate: float
+
+
+def percentile_range_str(count: int) -> str:
+    """
+    The span of each percentile die in a pool, rendered like the rolled
+    values of a Result.
+    """
+    faces = [cast(int, face) for face in Dice.PERCENTILE.faces]
+    return " ".join([f"{min(faces)}-{max(faces)}"] * count)
+
+
+ROW_CHUNK_SIZE = 10_000
+"""
+Outcomes rendered per task when rows are rendered in worker processes.
+"""
+
+
+def render_rows(
+    outcomes: Sequence[Tuple[Outcome, int]], percentiles: str, total: int
+) -> List[Tuple[str, float]]:
+    return [
+        (outcome_str(outcome) + percentiles, round(count / total * 100, 2))
+        for outcome, count in outcomes
+    ]
+
+
+def stream_results(dice_counts: Mapping[Dice, int], jobs: int = 1) -> ResultsStream:
+    """
+    One row per symbol outcome.  Percentile dice are uniform and
+    independent of the symbols, so rather than repeating every row for
+    each of their values, rows show the range they roll in.
+
+    Rendering the rows is most of the work on a large pool, so with
+    jobs > 1 they're rendered in chunks in that many worker processes.
+    """
+    distribution = joint_distribution(dice_counts, jobs)
+    percentiles = percentile_range_str(dice_counts.get(Dice.PERCENTILE, 0))
+    total = distribution.total
+
+    def rows() -> Iterator[Tuple[str, float]]:
+        outcomes = sorted(distribution.counts.items(), reverse=True)
+        if jobs <= 1 or len(outcomes) <= ROW_CHUNK_SIZE:
+            yield from render_rows(outcomes, percentiles, total)
+            return
+
+        chunks = [
+            outcomes[start : start + ROW_CHUNK_SIZE]
+            for start in range(0, len(outcomes), ROW_CHUNK_SIZE)
+        ]
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            for chunk in executor.map(
+                render_rows, chunks, repeat(percentiles), repeat(total)
+            ):
+                yield from chunk
+
+    success_rate = round(distribution.success_count() / total * 100, 2)
+
+    return ResultsStream(rows(), success_rate)
+
+
+def results_table(
+    dice_counts: Mapping[Dice, int], jobs: int = 1
+) -> Tuple[Dict[str, float], float]:
+    stream = stream_results(dice_counts, jobs)
+    return dict(stream.rows), stream.success_rate
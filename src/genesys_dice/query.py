@@ -0,0 +1,295 @@
+"""
+Questions about a pool's joint outcome distribution, such as the chance
+of succeeding with at least 2 net advantage, or the expected threat on a
+failure.
+
+Conditions and expressions are written in a small subset of Python over
+the outcome variables (see VARIABLES), for example
+"success > 0 and advantage >= 2".  They are compiled once and evaluated
+as numpy operations over every outcome at once.
+
+The percentile dice are independent of the symbol dice, so questions
+about only one or the other are answered from that side's distribution
+alone; the product of the two is only laid out for a question that
+mixes them.
+"""
+
+import ast
+from functools import lru_cache
+import operator
+from typing import Any, Callable, Dict, FrozenSet, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from genesys_dice.dice import Dice
+from genesys_dice.probability import (
+    DISTRIBUTION_CACHE_SIZE,
+    Histogram,
+    JointDistribution,
+    PoolKey,
+    cached_joint_distribution,
+    percentile_histogram,
+    pool_key,
+)
+
+VARIABLES = [
+    "success",
+    "advantage",
+    "triumph",
+    "despair",
+    "failure",
+    "threat",
+    "percentile",
+]
+"""
+success and advantage are net values, negative for net failure and net
+threat; failure and threat are those net amounts as positive numbers.
+percentile is the sum of the pool's percentile dice, 0 if it has none.
+"""
+
+PERCENTILE_VARIABLE = "percentile"
+
+Columns = Dict[str, np.ndarray]
+Space = Tuple[Columns, np.ndarray]
+Compiled = Callable[[Columns], Any]
+
+BINARY_OPERATORS: Dict[type, Callable[[Any, Any], Any]] = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+}
+
+COMPARE_OPERATORS: Dict[type, Callable[[Any, Any], Any]] = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+
+
+def _compile_node(node: ast.AST) -> Compiled:
+    match node:
+        case ast.Name(id=name) if name in VARIABLES:
+            return lambda columns: columns[name]
+        case ast.Name(id=name):
+            raise Exception(f"Unknown variable {name}, expected one of {VARIABLES}")
+        case ast.Constant(value=value) if type(value) in (int, float, bool):
+            return lambda columns: value
+        case ast.UnaryOp(op=ast.Not(), operand=operand):
+            inner = _compile_node(operand)
+            return lambda columns: np.logical_not(inner(columns))
+        case ast.UnaryOp(op=ast.USub(), operand=operand):
+            inner = _compile_node(operand)
+            return lambda columns: -inner(columns)
+        case ast.BoolOp(op=op, values=values):
+            parts = [_compile_node(value) for value in values]
+            combine = np.logical_and if isinstance(op, ast.And) else np.logical_or
+
+            def boolean(columns: Columns) -> Any:
+                result = parts[0](columns)
+                for part in parts[1:]:
+                    result = combine(result, part(columns))
+                return result
+
+            return boolean
+        case ast.BinOp(left=left, op=op, right=right) if type(op) in BINARY_OPERATORS:
+            function = BINARY_OPERATORS[type(op)]
+            a, b = _compile_node(left), _compile_node(right)
+            return lambda columns: function(a(columns), b(columns))
+        case ast.Compare(left=left, ops=ops, comparators=comparators):
+            terms = [_compile_node(left)] + [_compile_node(c) for c in comparators]
+            functions = [COMPARE_OPERATORS[type(op)] for op in ops]
+
+            def compare(columns: Columns) -> Any:
+                values = [term(columns) for term in terms]
+                result = functions[0](values[0], values[1])
+                for i, function in enumerate(functions[1:], start=1):
+                    result = np.logical_and(result, function(values[i], values[i + 1]))
+                return result
+
+            return compare
+        case _:
+            raise Exception(f"Unsupported expression: {ast.unparse(node)}")
+
+
+@lru_cache(maxsize=256)
+def compile_expression(expression: str) -> Compiled:
+    """
+    Compile a condition or expression over VARIABLES.
+    """
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError:
+        raise Exception(f"Invalid expression: {expression}")
+
+    return _compile_node(tree.body)
+
+
+@lru_cache(maxsize=256)
+def expression_variables(expression: str) -> FrozenSet[str]:
+    """
+    The variables an expression refers to.
+    """
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError:
+        raise Exception(f"Invalid expression: {expression}")
+
+    return frozenset(node.id for node in ast.walk(tree) if isinstance(node, ast.Name))
+
+
+class Query:
+    """
+    Answers questions about a joint distribution, and the distribution of
+    the percentile dice alongside it.  The outcomes are laid out as numpy
+    columns once, when the Query is created.
+    """
+
+    def __init__(
+        self, distribution: JointDistribution, percentiles: Optional[Histogram] = None
+    ) -> None:
+        outcomes = np.array(list(distribution.counts), dtype=np.int64).reshape(-1, 4)
+        self.columns: Columns = {
+            "success": outcomes[:, 0],
+            "advantage": outcomes[:, 1],
+            "triumph": outcomes[:, 2],
+            "despair": outcomes[:, 3],
+            "failure": np.maximum(-outcomes[:, 0], 0),
+            "threat": np.maximum(-outcomes[:, 1], 0),
+        }
+        self.weights = np.array(
+            [count / distribution.total for count in distribution.counts.values()]
+        )
+
+        percentiles = percentiles or {0: 1}
+        percentile_total = sum(percentiles.values())
+        self.percentile_columns: Columns = {
+            PERCENTILE_VARIABLE: np.array(list(percentiles), dtype=np.int64)
+        }
+        self.percentile_weights = np.array(
+            [count / percentile_total for count in percentiles.values()]
+        )
+        self._combined: Optional[Space] = None
+
+    def combined(self) -> Space:
+        """
+        Every symbol outcome paired with every percentile sum, built the
+        first time a question needs both.
+        """
+        if self._combined is None:
+            size = len(self.percentile_weights)
+            columns = {
+                name: np.repeat(column, size) for name, column in self.columns.items()
+            }
+            columns[PERCENTILE_VARIABLE] = np.tile(
+                self.percentile_columns[PERCENTILE_VARIABLE], len(self.weights)
+            )
+            weights = np.outer(self.weights, self.percentile_weights).ravel()
+            self._combined = (columns, weights)
+
+        return self._combined
+
+    def _space(self, *expressions: Optional[str]) -> Space:
+        names: FrozenSet[str] = frozenset().union(
+            *(expression_variables(e) for e in expressions if e is not None)
+        )
+
+        if PERCENTILE_VARIABLE not in names:
+            return self.columns, self.weights
+        if names == {PERCENTILE_VARIABLE}:
+            return self.percentile_columns, self.percentile_weights
+
+        return self.combined()
+
+    def _evaluate(self, expression: str, space: Space) -> np.ndarray:
+        columns, weights = space
+        values = compile_expression(expression)(columns)
+        return np.broadcast_to(values, weights.shape)
+
+    def evaluate(self, expression: str) -> np.ndarray:
+        """
+        Value of the expression for every outcome.
+        """
+        return self._evaluate(expression, self._space(expression))
+
+    def _weights(self, given: Optional[str], space: Space) -> np.ndarray:
+        if given is None:
+            return space[1]
+
+        weights: np.ndarray = space[1] * self._evaluate(given, space).astype(bool)
+        return weights
+
+    def probability(self, condition: str, given: Optional[str] = None) -> float:
+        """
+        P(condition), or P(condition | given), in [0, 1].
+        """
+        space = self._space(condition, given)
+        weights = self._weights(given, space)
+        total = weights.sum()
+
+        if total == 0:
+            return 0.0
+
+        matches = self._evaluate(condition, space).astype(bool)
+        return float(weights[matches].sum() / total)
+
+    def expectation(self, expression: str, given: Optional[str] = None) -> float:
+        """
+        E[expression], or E[expression | given].
+        """
+        space = self._space(expression, given)
+        weights = self._weights(given, space)
+        total = weights.sum()
+
+        if total == 0:
+            return 0.0
+
+        return float((self._evaluate(expression, space) * weights).sum() / total)
+
+    def marginal(
+        self, expression: str, given: Optional[str] = None
+    ) -> Dict[int, float]:
+        """
+        Probability of each value of the expression.
+        """
+        space = self._space(expression, given)
+        weights = self._weights(given, space)
+        values, inverse = np.unique(
+            self._evaluate(expression, space), return_inverse=True
+        )
+        sums = np.bincount(inverse.ravel(), weights=weights, minlength=len(values))
+        total = float(weights.sum())
+
+        if total == 0:
+            return {}
+
+        return {
+            value: probability / total
+            for value, probability in zip(values.tolist(), sums.tolist())
+            if probability > 0
+        }
+
+    def cdf(self, expression: str, given: Optional[str] = None) -> Dict[int, float]:
+        """
+        P(expression <= value) for each value the expression takes.
+        """
+        marginal = self.marginal(expression, given)
+        values: List[int] = sorted(marginal)
+        cumulative = np.cumsum([marginal[value] for value in values])
+
+        return dict(zip(values, cumulative.tolist()))
+
+
+@lru_cache(maxsize=DISTRIBUTION_CACHE_SIZE)
+def cached_query(key: PoolKey, percentile_count: int = 0) -> Query:
+    return Query(cached_joint_distribution(key), percentile_histogram(percentile_count))
+
+
+def pool_query(dice_counts: Mapping[Dice, int]) -> Query:
+    """
+    The Query for a pool, cached along with its distribution.
+    """
+    return cached_query(pool_key(dice_counts), dice_counts.get(Dice.PERCENTILE, 0))
@@ -0,0 +1,215 @@
+"""
+House-ruled dice, defined in YAML.
+
+Each entry in a registry file redefines one die type: its faces, short
+code, symbol and colour, upgrade and downgrade, and Foundry code, for
+example
+
+    - die: boost
+      short_code: B
+      colour: "#72cddc"
+      faces: [blank, success, success, [success, advantage], advantage, advantage]
+
+Any key but die can be left out to keep the current value.  Faces are
+symbol names, lists of symbol names, or positive numbers for the
+percentile die.
+
+Only the built-in die types can be redefined; new ones, such as a force
+die, can't be added.  Die types are a fixed enum that pools, the encoding
+of results and the TUI all index by, and a force die's light and dark
+side symbols are outside what the probability engines model.
+
+Entries are compiled into Die objects, whose face tables are the ones the
+roller and the probability engines read, so a registered die is as fast
+as a built-in one.  The built-in dice are defined in Python, so nothing
+is parsed at startup unless a registry file exists.
+"""
+
+import os
+from typing import Any, Dict, List, Optional, Tuple, cast
+
+import yaml
+
+from genesys_dice.data import PLATFORM_DIRS
+from genesys_dice.dice import (
+    Dice,
+    Die,
+    DieFoundryCode,
+    DieShortCode,
+    Face,
+    Symbol,
+    dice_display,
+    dice_foundry_codes,
+    dice_map,
+    dice_short_codes,
+    dice_symbol_display,
+)
+from genesys_dice.lookup import get_lookup_table
+from genesys_dice.moments import die_moments
+from genesys_dice.probability import cache_clear
+from genesys_dice.query import cached_query
+from genesys_dice.reroll import cache_clear as reroll_cache_clear
+from genesys_dice.sampling import outcome_table
+
+REGISTRY_FILE_NAME = "genesys-dice-dice.yaml"
+
+MAX_FACES = 256
+"""
+A Result stores each die's face index in a single byte.
+"""
+
+MAX_PERCENTILE_FACE = 2**15 - 1
+"""
+Percentile rolls are stored as int16, with 0 for a missing die.
+"""
+
+REGISTRY_KEYS = [
+    "die",
+    "faces",
+    "short_code",
+    "symbol",
+    "colour",
+    "upgrade",
+    "downgrade",
+    "foundry",
+]
+
+
+def default_registry_path() -> str:
+    return os.path.join(PLATFORM_DIRS.user_config_dir, REGISTRY_FILE_NAME)
+
+
+def parse_die_type(value: Any) -> Dice:
+    try:
+        return Dice(value)
+    except ValueError:
+        raise Exception(
+            f"Unknown die: {value}, expected one of {[d.value for d in Dice]} "
+            "(new die types can't be added)"
+        )
+
+
+def parse_face(die_type: Dice, value: Any) -> Face:
+    if die_type is Dice.PERCENTILE:
+        if type(value) is not int or not 0 < value <= MAX_PERCENTILE_FACE:
+            raise Exception(
+                f"Percentile faces must be numbers from 1 to "
+                f"{MAX_PERCENTILE_FACE}, got {value}"
+            )
+        return value
+
+    try:
+        if type(value) is list:
+            return [Symbol(symbol) for symbol in value]
+        return Symbol(value)
+    except ValueError:
+        raise Exception(
+            f"Invalid face for {die_type}: {value}, "
+            f"expected symbols from {[s.value for s in Symbol]}"
+        )
+
+
+def compile_entry(entry: Dict[str, Any]) -> Tuple[Die, DieShortCode, Tuple[str, str]]:
+    """
+    The Die an entry defines, with its short code and its symbol and
+    colour, starting from the die type's current definition.
+    """
+    if type(entry) is not dict:
+        raise Exception(f"Expected a die definition, got {entry}")
+
+    unknown = [key for key in entry if key not in REGISTRY_KEYS]
+    if len(unknown) > 0:
+        raise Exception(f"Unknown keys {unknown}, expected some of {REGISTRY_KEYS}")
+
+    die_type = parse_die_type(entry.get("die"))
+    current = die_type.die
+
+    faces = current.faces
+    if "faces" in entry:
+        faces = [parse_face(die_type, face) for face in entry["faces"] or []]
+        if not 0 < len(faces) <= MAX_FACES:
+            raise Exception(f"{die_type} must have 1 to {MAX_FACES} faces")
+
+    upgrade, downgrade = current.upgrade, current.downgrade
+    if "upgrade" in entry:
+        upgrade = entry["upgrade"] and parse_die_type(entry["upgrade"])
+    if "downgrade" in entry:
+        downgrade = entry["downgrade"] and parse_die_type(entry["downgrade"])
+
+    short_code = str(entry.get("short_code", die_type.short_code))
+    if len(short_code) != 1 or short_code != short_code.upper() or short_code.isspace():
+        raise Exception(f"Invalid short code for {die_type}: {short_code}")
+
+    symbol, colour = die_type.symbol
+    symbol_display = (
+        str(entry.get("symbol", symbol)),
+        str(entry.get("colour", colour)),
+    )
+
+    return (
+        Die(die_type, faces, upgrade=upgrade, downgrade=downgrade),
+        cast(DieShortCode, short_code),
+        symbol_display,
+    )
+
+
+def register_dice(entries: List[Dict[str, Any]]) -> List[Dice]:
+    """
+    Compile and install every entry, or none of them if any is invalid.
+    Returns the die types that were redefined.
+    """
+    if type(entries) is not list:
+        raise Exception("A dice registry must be a list of dice")
+
+    compiled = [compile_entry(entry) for entry in entries]
+
+    short_codes = dict(dice_display)
+    for die, short_code, _ in compiled:
+        short_codes[die.die_type] = short_code
+    if len(set(short_codes.values())) != len(short_codes):
+        raise Exception(f"Short codes must be unique: {short_codes}")
+
+    for (die, short_code, symbol_display), entry in zip(compiled, entries):
+        dice_map[die.die_type] = die
+        dice_display[die.die_type] = short_code
+        dice_symbol_display[die.die_type] = symbol_display
+        if entry.get("foundry") is not None:
+            dice_foundry_codes[die.die_type] = cast(DieFoundryCode, entry["foundry"])
+
+    dice_short_codes.clear()
+    for die_type, code in dice_display.items():
+        dice_short_codes[code] = die_type
+
+    clear_caches()
+
+    return [die.die_type for die, _, _ in compiled]
+
+
+def load_registry(path: Optional[str] = None) -> List[Dice]:
+    """
+    Register the dice in the file at path.  Without a path, the default
+    registry file is loaded if there is one.
+    """
+    if path is None:
+        path = default_registry_path()
+        if not os.path.exists(path):
+            return []
+
+    with open(path, "r") as file:
+        entries = yaml.safe_load(file)
+
+    return register_dice(entries or [])
+
+
+def clear_caches() -> None:
+    """
+    Forget everything computed from the previous face tables.  Every cache
+    of anything derived from the faces belongs here, or its engine keeps
+    the old dice after a redefinition.
+    """
+    cache_clear()
+    reroll_cache_clear()
+    cached_query.cache_clear()
+    outcome_table.cache_clear()
+    die_moments.cache_clear()
+    get_lookup_table.cache_clear()
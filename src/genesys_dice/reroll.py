@@ -0,0 +1,620 @@
+"""
+Odds under talents that reroll or remove dice after the roll.
+
+A RerollPolicy lets up to some number of dice, of some die types, be
+rerolled (or removed) once the roll is seen, either by the player, to
+make the check succeed, or by an opponent, to make it fail.
+
+For one die the chooser's best choice is found exactly.  Whether
+rerolling a die beats keeping the roll only depends on the die's type
+and net success, so only the lowest useful die of each type (the highest,
+for an opponent) is worth considering, and one is rerolled if that makes
+success most likely (least likely).  Ties keep the roll, then go to the
+first die type.  The dice of each type are folded, by dynamic
+programming over their face tables, into a table by the net success of
+their lowest useful die, and the types' tables are convolved by
+multiplying their Fourier transforms.  A second array for each type
+tracks the net advantage without its lowest die, so that die's
+advantage needn't be part of the state.
+
+For more dice the state would grow with every combination of lowest
+dice, so they're chosen by a heuristic instead (see ranked_reroll_odds):
+the eligible dice are ranked by how much a reroll is expected to gain
+the chooser, and the best j of them rerolled for whichever j makes
+success most likely.  RerollPolicy.optimal tells the two apart.
+
+Probabilities are floats.
+"""
+
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, FrozenSet, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from genesys_dice.dice import DIE_CODES, Dice, DiceCounts, get_dice_from_str
+from genesys_dice.probability import SYMBOL_DICE
+
+OBJECTIVES = ["player", "opponent"]
+"""
+Who chooses the dice: the player, to make the check succeed, or an
+opponent, to make it fail.
+"""
+
+REROLL_CACHE_SIZE = 64
+TIE_TOLERANCE = 1e-12
+"""
+Options whose odds differ by less than this are tied, as rounding may
+make equal ones differ.
+"""
+
+FFT_NOISE = 1e-14
+"""
+Probabilities below this after convolving by Fourier transform are
+rounding error, and are dropped.
+"""
+
+Vector = Tuple[int, int]
+"""
+Net success and net advantage.
+"""
+
+Candidate = Tuple[Dice, int, int]
+"""
+A rolled die that the chooser might reroll, and its net success and net
+advantage.
+"""
+
+Candidates = Tuple[Candidate, ...]
+Distribution = Dict[Vector, float]
+
+LowestFaces = Dict[Optional[int], Tuple[np.ndarray, np.ndarray]]
+"""
+By the net success of the lowest useful die (None without one), the
+chance of each net success and net advantage, and of each net success
+and net advantage without that die's advantage.
+"""
+
+
+@dataclass(frozen=True)
+class RerollPolicy:
+    """
+    Up to dice dice, of die_types (any symbol die if None), are rerolled,
+    or removed if remove is set, by whoever objective names.
+    """
+
+    dice: int = 1
+    die_types: Optional[FrozenSet[Dice]] = None
+    remove: bool = False
+    objective: str = "player"
+
+    def __post_init__(self) -> None:
+        if self.objective not in OBJECTIVES:
+            raise Exception(
+                f"Unknown objective {self.objective}, expected one of {OBJECTIVES}"
+            )
+        if self.dice < 0:
+            raise Exception(f"Can't reroll {self.dice} dice")
+
+    @property
+    def sign(self) -> int:
+        """
+        1 if the chooser wants the check to succeed, -1 if to fail.
+        """
+        return 1 if self.objective == "player" else -1
+
+    @property
+    def optimal(self) -> bool:
+        """
+        Whether the chooser's best choice is found, rather than a
+        heuristic one: up to one die.
+        """
+        return self.dice <= 1
+
+    @staticmethod
+    def from_codes(
+        dice: int,
+        codes: Optional[str] = None,
+        remove: bool = False,
+        objective: str = "player",
+    ) -> "RerollPolicy":
+        """
+        A policy for the die types in a short code string, e.g. "DC".
+        """
+        die_types = frozenset(get_dice_from_str(codes)) if codes else None
+        return RerollPolicy(dice, die_types, remove, objective)
+
+    def eligible(self, die_type: Dice) -> bool:
+        if die_type is Dice.PERCENTILE:
+            return False
+
+        return self.die_types is None or die_type in self.die_types
+
+    def __str__(self) -> str:
+        action = "removes" if self.remove else "rerolls"
+        chooser = "opponent" if self.objective == "opponent" else "player"
+        dice = "die" if self.dice == 1 else "dice"
+        types = (
+            " " + "".join(sorted(d.short_code for d in self.die_types))
+            if self.die_types is not None
+            else ""
+        )
+        return f"{chooser} {action} {self.dice}{types} {dice}"
+
+
+TALENTS: Dict[str, RerollPolicy] = {
+    "Reroll 1": RerollPolicy(1),
+    "Reroll 2": RerollPolicy(2),
+    "Remove 1 negative": RerollPolicy(
+        1,
+        frozenset({Dice.DIFFICULTY, Dice.CHALLENGE, Dice.SETBACK}),
+        remove=True,
+    ),
+    "Opponent rerolls 1": RerollPolicy(1, objective="opponent"),
+}
+"""
+Policies to compare a pool with in the TUI.
+"""
+
+
+@lru_cache(maxsize=None)
+def face_distribution(die_type: Dice) -> Distribution:
+    """
+    Chance of each net success and net advantage of one die.
+    """
+    counts = Counter(
+        (vector.net_success, vector.net_advantage) for vector in die_type.table
+    )
+    return {vector: count / len(die_type.table) for vector, count in counts.items()}
+
+
+def convolve_distributions(a: Distribution, b: Distribution) -> Distribution:
+    result: Distribution = {}
+
+    for (a_success, a_advantage), a_p in a.items():
+        for (b_success, b_advantage), b_p in b.items():
+            vector = (a_success + b_success, a_advantage + b_advantage)
+            result[vector] = result.get(vector, 0.0) + a_p * b_p
+
+    return result
+
+
+@lru_cache(maxsize=None)
+def fresh_distribution(die_types: Tuple[Dice, ...]) -> Distribution:
+    """
+    Net success and advantage of rolling one of each die in die_types.
+    """
+    distribution: Distribution = {(0, 0): 1.0}
+
+    for die_type in die_types:
+        distribution = convolve_distributions(distribution, face_distribution(die_type))
+
+    return distribution
+
+
+@lru_cache(maxsize=None)
+def mean_vector(die_type: Dice) -> Tuple[float, float]:
+    distribution = face_distribution(die_type)
+    return (
+        sum(s * p for (s, _), p in distribution.items()),
+        sum(a * p for (_, a), p in distribution.items()),
+    )
+
+
+def gain(policy: RerollPolicy, candidate: Candidate) -> Tuple[float, float]:
+    """
+    Expected net success and advantage the chooser gains by rerolling or
+    removing the die.
+    """
+    die_type, success, advantage = candidate
+    fresh = (0.0, 0.0) if policy.remove else mean_vector(die_type)
+
+    return policy.sign * (fresh[0] - success), policy.sign * (fresh[1] - advantage)
+
+
+def add_candidate(
+    policy: RerollPolicy, candidates: Candidates, candidate: Candidate
+) -> Candidates:
+    """
+    The best candidates, as many as the policy's dice, most gained first.
+    """
+    ranked = sorted(
+        candidates + (candidate,),
+        key=lambda c: (*(-g for g in gain(policy, c)), DIE_CODES.index(c[0])),
+    )
+    return tuple(ranked[: policy.dice])
+
+
+def shifted(array: np.ndarray, offsets: Sequence[int]) -> np.ndarray:
+    """
+    The array moved along each axis by its offset, with zeros shifted in.
+    """
+    result = np.zeros_like(array)
+    source, target = [], []
+
+    for offset, size in zip(offsets, array.shape):
+        if offset >= 0:
+            source.append(slice(0, size - offset))
+            target.append(slice(offset, size))
+        else:
+            source.append(slice(-offset, size))
+            target.append(slice(0, size + offset))
+
+    result[tuple(target)] = array[tuple(source)]
+    return result
+
+
+@dataclass
+class RerollOdds:
+    """
+    The joint distribution of net success and net advantage after the
+    policy was applied.
+    """
+
+    policy: RerollPolicy
+    joint: Distribution = field(default_factory=dict)
+
+    @property
+    def success_probability(self) -> float:
+        return sum(p for (success, _), p in self.joint.items() if success > 0)
+
+    @property
+    def mean_advantage(self) -> float:
+        return sum(advantage * p for (_, advantage), p in self.joint.items())
+
+    @property
+    def advantage_probability(self) -> float:
+        return sum(p for (_, advantage), p in self.joint.items() if advantage > 0)
+
+    def marginal(self, column: int) -> Dict[int, float]:
+        """
+        Chance of each net success (column 0) or net advantage (column 1).
+        """
+        marginal: Dict[int, float] = {}
+        for vector, p in self.joint.items():
+            marginal[vector[column]] = marginal.get(vector[column], 0.0) + p
+
+        return dict(sorted(marginal.items()))
+
+    @property
+    def success(self) -> Dict[int, float]:
+        return self.marginal(0)
+
+    @property
+    def advantage(self) -> Dict[int, float]:
+        return self.marginal(1)
+
+
+class Grid:
+    """
+    Arrays over every net success and net advantage the pool can end up
+    with, rerolls included: each die's range, widened to 0 for a removed
+    die.
+    """
+
+    def __init__(self, dice: Sequence[Dice]) -> None:
+        distributions = [face_distribution(die_type) for die_type in dice]
+        self.low = [
+            sum(min(0, min(v[axis] for v in d)) for d in distributions)
+            for axis in (0, 1)
+        ]
+        high = [
+            sum(max(0, max(v[axis] for v in d)) for d in distributions)
+            for axis in (0, 1)
+        ]
+        self.shape = (high[0] - self.low[0] + 1, high[1] - self.low[1] + 1)
+        self.successes = np.arange(self.shape[0]) + self.low[0]
+        self.circular_successes = np.roll(self.successes, self.low[0])
+
+    def start(self) -> np.ndarray:
+        array = np.zeros(self.shape)
+        array[-self.low[0], -self.low[1]] = 1.0
+        return array
+
+    def from_circular(self, circular: np.ndarray) -> np.ndarray:
+        """
+        The array from a circular one, in which each value is at its index
+        modulo the shape rather than offset by low.
+        """
+        return np.roll(circular, (-self.low[0], -self.low[1]), axis=(0, 1))
+
+    def odds(self, policy: RerollPolicy, array: np.ndarray) -> RerollOdds:
+        odds = RerollOdds(policy)
+        for i, j in zip(*np.nonzero(array)):
+            vector = (int(i) + self.low[0], int(j) + self.low[1])
+            odds.joint[vector] = float(array[i, j])
+
+        return odds
+
+
+def resolve_ranked(
+    policy: RerollPolicy, grid: Grid, candidates: Candidates, array: np.ndarray
+) -> np.ndarray:
+    """
+    The array after the chooser rerolls the best j candidates, choosing j
+    separately for each net success.  Fewer dice win ties.
+    """
+    sign = policy.sign
+    options = []
+
+    for j in range(len(candidates) + 1):
+        chosen = candidates[:j]
+        removed = (sum(c[1] for c in chosen), sum(c[2] for c in chosen))
+        fresh = (
+            {(0, 0): 1.0}
+            if policy.remove
+            else fresh_distribution(tuple(c[0] for c in chosen))
+        )
+        kept = grid.successes - removed[0]
+        succeeds = np.zeros(grid.shape[0])
+        for (s, _), p in fresh.items():
+            succeeds += p * (kept + s > 0)
+        advantage = sum(a * p for (_, a), p in fresh.items()) - removed[1]
+        options.append((removed, fresh, sign * succeeds, sign * advantage))
+
+    best = np.zeros(grid.shape[0], dtype=int)
+    best_succeeds = options[0][2]
+    best_advantage = np.full(grid.shape[0], options[0][3])
+    for j, (_, _, succeeds, advantage) in enumerate(options[1:], 1):
+        ties = np.isclose(succeeds, best_succeeds, rtol=0, atol=TIE_TOLERANCE)
+        better = np.where(
+            ties, advantage > best_advantage + TIE_TOLERANCE, succeeds > best_succeeds
+        )
+        best = np.where(better, j, best)
+        best_succeeds = np.where(better, succeeds, best_succeeds)
+        best_advantage = np.where(better, advantage, best_advantage)
+
+    result = np.zeros_like(array)
+    for j, (removed, fresh, _, _) in enumerate(options):
+        rows = array * (best == j)[:, np.newaxis]
+        if not rows.any():
+            continue
+        for (s, a), p in fresh.items():
+            result += shifted(rows, (s - removed[0], a - removed[1])) * p
+
+    return result
+
+
+def useful(policy: RerollPolicy, die_type: Dice, success: int) -> bool:
+    """
+    Whether rerolling or removing a die showing that many net successes
+    could ever change the check in the chooser's favour.
+    """
+    fresh = [0] if policy.remove else [s for s, _ in face_distribution(die_type)]
+    best = max(fresh) if policy.sign > 0 else min(fresh)
+
+    return policy.sign * (best - success) > 0
+
+
+def lowest_faces(
+    policy: RerollPolicy, grid: Grid, die_type: Dice, count: int
+) -> LowestFaces:
+    """
+    The LowestFaces of count dice of die_type, or for a die type the
+    policy can't reroll, just their distribution.  The arrays are
+    circular, with each value at its index modulo the grid's shape, so
+    that they convolve by multiplying their Fourier transforms.
+    """
+    start = np.zeros(grid.shape)
+    start[0, 0] = 1.0
+    states: Dict[Optional[Vector], np.ndarray] = {None: start}
+    tracked = policy.dice > 0 and policy.eligible(die_type)
+
+    def rank(vector: Vector) -> Vector:
+        return policy.sign * vector[0], policy.sign * vector[1]
+
+    for _ in range(count):
+        folded: Dict[Optional[Vector], np.ndarray] = {}
+
+        for lowest, array in states.items():
+            for (s, a), p in face_distribution(die_type).items():
+                key = lowest
+                if tracked and useful(policy, die_type, s):
+                    if lowest is None or rank((s, a)) < rank(lowest):
+                        key = (s, a)
+
+                moved = np.roll(array, (s, a), axis=(0, 1)) * p
+                if key in folded:
+                    folded[key] += moved
+                else:
+                    folded[key] = moved
+
+        states = folded
+
+    table: LowestFaces = {}
+    for lowest, array in states.items():
+        if lowest is None:
+            table[None] = (array, array)
+        else:
+            without = np.roll(array, -lowest[1], axis=1)
+            if lowest[0] in table:
+                plain, previous = table[lowest[0]]
+                without = previous + without
+                array = plain + array
+            table[lowest[0]] = (array, without)
+
+    return table
+
+
+def fresh_faces(policy: RerollPolicy, die_type: Dice) -> Distribution:
+    """
+    What replaces a rerolled or removed die.
+    """
+    return {(0, 0): 1.0} if policy.remove else face_distribution(die_type)
+
+
+def succeeds_after(
+    policy: RerollPolicy, successes: np.ndarray, die_type: Dice, success: int
+) -> np.ndarray:
+    """
+    The chance of success, for each of the net successes, after rerolling
+    or removing a die_type die showing success net successes.
+    """
+    succeeds = np.zeros(len(successes))
+    for (s, _), p in fresh_faces(policy, die_type).items():
+        succeeds += p * (successes - success + s > 0)
+
+    return succeeds
+
+
+def choose_reroll(
+    policy: RerollPolicy, options: Sequence[np.ndarray], kept: np.ndarray
+) -> np.ndarray:
+    """
+    For each net success, the index of the option the chooser takes given
+    the chance of success after each, or -1 to keep the roll, which wins
+    ties, as does an earlier option.
+    """
+    best = np.full(len(kept), -1)
+    score = policy.sign * kept
+
+    for i, succeeds in enumerate(options):
+        better = policy.sign * succeeds > score + TIE_TOLERANCE
+        best = np.where(better, i, best)
+        score = np.where(better, policy.sign * succeeds, score)
+
+    return best
+
+
+def best_reroll_odds(dice_counts: DiceCounts, policy: RerollPolicy) -> RerollOdds:
+    """
+    The odds when the chooser makes the best choice of up to one die.
+    """
+    counts = [(t, n) for t, n in dice_counts.nonzero() if t in SYMBOL_DICE]
+    grid = Grid([die_type for die_type, count in counts for _ in range(count)])
+    delta = np.zeros(grid.shape)
+    delta[0, 0] = 1.0
+
+    # The Fourier transforms of the plain arrays, under None, and of the
+    # arrays without each die type's lowest useful die, under that type
+    Spectra = Dict[Optional[Dice], np.ndarray]
+    states: Dict[Tuple[Optional[int], ...], Spectra] = {(): {None: np.fft.rfft2(delta)}}
+    after: Dict[Tuple[Dice, int], np.ndarray] = {}
+
+    for die_type, count in counts:
+        table = lowest_faces(policy, grid, die_type, count)
+        spectra = {
+            lowest: (np.fft.rfft2(plain), np.fft.rfft2(without))
+            for lowest, (plain, without) in table.items()
+        }
+        combined: Dict[Tuple[Optional[int], ...], Spectra] = {}
+
+        for lowest in table:
+            if lowest is not None:
+                after[(die_type, lowest)] = succeeds_after(
+                    policy, grid.circular_successes, die_type, lowest
+                )
+
+        for key, layers in states.items():
+            for lowest, (plain, without) in spectra.items():
+                convolved: Spectra = {
+                    layer: spectrum * plain for layer, spectrum in layers.items()
+                }
+                if lowest is not None:
+                    convolved[die_type] = layers[None] * without
+                combined[key + (lowest,)] = convolved
+
+        states = combined
+
+    # Rows are gathered by the die rerolled, so that each is shifted by
+    # what replaces it only once.  The arrays stay circular until the end.
+    final = np.zeros(grid.shape)
+    rerolled: Dict[Tuple[Dice, int], np.ndarray] = {}
+    kept = (grid.circular_successes > 0).astype(float)
+
+    for key, layers in states.items():
+        options = [
+            (die_type, s) for (die_type, _), s in zip(counts, key) if s is not None
+        ]
+        best = choose_reroll(policy, [after[option] for option in options], kept)
+
+        # Only the arrays of the choices made for some net success
+        layer_of = {-1: None, **{i: option[0] for i, option in enumerate(options)}}
+        taken = [i for i in layer_of if (best == i).any()]
+        stack = np.stack([layers[layer_of[i]] for i in taken])
+        arrays = dict(zip(taken, np.fft.irfft2(stack, s=grid.shape)))
+
+        if -1 in arrays:
+            final += arrays[-1] * (best == -1)[:, np.newaxis]
+        for i, option in enumerate(options):
+            if i not in arrays:
+                continue
+            rows = arrays[i] * (best == i)[:, np.newaxis]
+            if option in rerolled:
+                rerolled[option] += rows
+            else:
+                rerolled[option] = rows
+
+    for (rerolled_type, success), rows in rerolled.items():
+        for (s, a), p in fresh_faces(policy, rerolled_type).items():
+            final += np.roll(rows, (s - success, a), axis=(0, 1)) * p
+
+    final = grid.from_circular(final)
+    final[final < FFT_NOISE] = 0.0
+    return grid.odds(policy, final)
+
+
+def ranked_reroll_odds(dice_counts: DiceCounts, policy: RerollPolicy) -> RerollOdds:
+    """
+    The odds when the chooser ranks the dice by their expected gain and
+    rerolls the best j of them, for more dice than best_reroll_odds can
+    choose from.
+    """
+    dice = [die_type for die_type in dice_counts.dice if die_type in SYMBOL_DICE]
+    grid = Grid(dice)
+    states: Dict[Candidates, np.ndarray] = {(): grid.start()}
+
+    for die_type in dice:
+        folded: Dict[Candidates, np.ndarray] = {}
+
+        for candidates, array in states.items():
+            for (s, a), p in face_distribution(die_type).items():
+                candidate = (die_type, s, a)
+                key = candidates
+                if policy.eligible(die_type) and gain(policy, candidate) > (0, 0):
+                    key = add_candidate(policy, candidates, candidate)
+
+                moved = shifted(array, (s, a)) * p
+                if key in folded:
+                    folded[key] += moved
+                else:
+                    folded[key] = moved
+
+        states = folded
+
+    final = sum(
+        (
+            resolve_ranked(policy, grid, candidates, array)
+            for candidates, array in states.items()
+        ),
+        np.zeros(grid.shape),
+    )
+    return grid.odds(policy, final)
+
+
+@lru_cache(maxsize=REROLL_CACHE_SIZE)
+def cached_reroll_odds(dice_counts: DiceCounts, policy: RerollPolicy) -> RerollOdds:
+    if policy.optimal:
+        return best_reroll_odds(dice_counts, policy)
+
+    return ranked_reroll_odds(dice_counts, policy)
+
+
+def reroll_odds(dice_counts: Mapping[Dice, int], policy: RerollPolicy) -> RerollOdds:
+    """
+    The pool's odds under the policy, cached per pool and policy.
+    """
+    counts = (
+        dice_counts
+        if isinstance(dice_counts, DiceCounts)
+        else DiceCounts(dice_counts.get(die_type, 0) for die_type in DIE_CODES)
+    )
+    return cached_reroll_odds(counts, policy)
+
+
+def cache_clear() -> None:
+    face_distribution.cache_clear()
+    fresh_distribution.cache_clear()
+    mean_vector.cache_clear()
+    cached_reroll_odds.cache_clear()
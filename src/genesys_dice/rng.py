@@ -0,0 +1,138 @@
+"""
+Sources of randomness for rolling dice.
+
+Rolls draw from a session RNG (see get_rng and set_rng) unless one is
+passed in.  A roll can also be made from a seed of its own, which is
+recorded on the Result so that the roll can be replayed exactly.
+"""
+
+from abc import ABC, abstractmethod
+import os
+import random
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+SEED_BITS = 63
+
+
+class RNG(ABC):
+    """
+    Draws uniform face indices.  Subclasses implement randrange, and may
+    override indices to draw a whole pool at once.
+    """
+
+    seed: Optional[int] = None
+
+    @abstractmethod
+    def randrange(self, n: int) -> int:
+        """
+        A uniform integer in range(n).
+        """
+
+    def indices(self, sizes: Sequence[int]) -> List[int]:
+        """
+        One index in range(size) for each of sizes.
+        """
+        return [self.randrange(size) for size in sizes]
+
+    def spawn_seed(self) -> int:
+        """
+        A fresh seed drawn from this stream, for seeding a single roll.
+        """
+        return self.randrange(2**SEED_BITS)
+
+
+class RandomRNG(RNG):
+    """
+    A random.Random stream.
+    """
+
+    def __init__(self, seed: Optional[int] = None) -> None:
+        self.seed = seed
+        self.random = random.Random(seed)
+
+    def randrange(self, n: int) -> int:
+        return self.random.randrange(n)
+
+
+class NumpyRNG(RNG):
+    """
+    A numpy Generator stream.  A pool is drawn in one call.
+    """
+
+    def __init__(self, seed: Optional[int] = None) -> None:
+        self.seed = seed
+        self.generator = np.random.default_rng(seed)
+
+    def randrange(self, n: int) -> int:
+        return int(self.generator.integers(n))
+
+    def indices(self, sizes: Sequence[int]) -> List[int]:
+        return [int(index) for index in self.generator.integers(0, sizes)]
+
+
+class UrandomRNG(RNG):
+    """
+    Operating system entropy, read from os.urandom in blocks of buffer_size
+    bytes rather than once per die.  It can't be seeded.
+    """
+
+    def __init__(self, buffer_size: int = 4096) -> None:
+        self.buffer_size = buffer_size
+        self.buffer = b""
+        self.position = 0
+
+    def read(self, size: int) -> bytes:
+        if self.position + size > len(self.buffer):
+            self.buffer = self.buffer[self.position :] + os.urandom(
+                max(self.buffer_size, size)
+            )
+            self.position = 0
+
+        data = self.buffer[self.position : self.position + size]
+        self.position += size
+
+        return data
+
+    def randrange(self, n: int) -> int:
+        """
+        Rejection sampling, so every index is exactly equally likely.
+        """
+        size = max((n - 1).bit_length() + 7, 8) // 8
+        span = 256**size
+        limit = span - span % n
+
+        while True:
+            value = int.from_bytes(self.read(size), "little")
+            if value < limit:
+                return value % n
+
+
+RNG_KINDS = ["random", "numpy", "urandom"]
+
+
+def make_rng(kind: str = "random", seed: Optional[int] = None) -> RNG:
+    match kind:
+        case "random":
+            return RandomRNG(seed)
+        case "numpy":
+            return NumpyRNG(seed)
+        case "urandom":
+            if seed is not None:
+                raise Exception("The urandom RNG can't be seeded")
+            return UrandomRNG()
+        case _:
+            raise Exception(f"Unknown RNG: {kind}")
+
+
+session_rng: RNG = RandomRNG()
+
+
+def get_rng() -> RNG:
+    return session_rng
+
+
+def set_rng(rng: RNG) -> None:
+    global session_rng
+    session_rng = rng
@@ -0,0 +1,274 @@
+"""
+Vectorized rolling of a dice pool many times over, or of many different
+pools at once, and Monte Carlo estimates built on top of it.
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from functools import cache
+import math
+from statistics import NormalDist
+from typing import Any, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from genesys_dice.dice import DIE_CODES, Dice, DiceCounts, Result
+from genesys_dice.probability import vector_outcome
+
+
+@cache
+def outcome_table(die_type: Dice) -> np.ndarray:
+    """
+    One row per face of the die: net success, net advantage, triumph and
+    despair.
+    """
+    return np.array([vector_outcome(v) for v in die_type.table], dtype=np.int8)
+
+
+@dataclass
+class Rolls:
+    """
+    Columnar results of rolling the same pool n times, or of rolling n
+    pools once each.  Percentile dice are kept separately, one column per
+    die, and 0 where a pool has fewer percentile dice than the column.
+    """
+
+    success: np.ndarray
+    advantage: np.ndarray
+    triumph: np.ndarray
+    despair: np.ndarray
+    percentile: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.success)
+
+    @property
+    def successes(self) -> np.ndarray:
+        return self.success > 0
+
+    def success_rate(self) -> float:
+        return float(self.successes.mean()) if len(self) > 0 else 0.0
+
+    def result(self, i: int) -> Result:
+        """
+        Roll i as a Result, without per-die details.
+        """
+        return Result.from_totals(
+            int(self.success[i]),
+            int(self.advantage[i]),
+            int(self.triumph[i]),
+            int(self.despair[i]),
+            percentiles=[int(p) for p in self.percentile[i] if p > 0],
+        )
+
+
+def draw_percentiles(rng: np.random.Generator, size: Tuple[int, int]) -> np.ndarray:
+    """
+    Percentile rolls from the percentile die's faces, which a registry may
+    have redefined.
+    """
+    faces = np.array(Dice.PERCENTILE.faces, dtype=np.int16)
+    return faces[rng.integers(0, len(faces), size=size)]
+
+
+def roll_many(
+    dice_counts: Mapping[Dice, int],
+    n: int,
+    rng: Optional[np.random.Generator] = None,
+) -> Rolls:
+    if rng is None:
+        rng = np.random.default_rng()
+
+    totals = np.zeros((n, 4), dtype=np.int32)
+    percentile_count = dice_counts.get(Dice.PERCENTILE, 0)
+
+    for die_type, count in dice_counts.items():
+        if count == 0 or die_type is Dice.PERCENTILE:
+            continue
+
+        table = outcome_table(die_type)
+        faces = rng.integers(0, len(table), size=(count, n))
+        for column in faces:
+            totals += table[column]
+
+    percentile = draw_percentiles(rng, (n, percentile_count))
+
+    return Rolls(
+        success=totals[:, 0],
+        advantage=totals[:, 1],
+        triumph=totals[:, 2],
+        despair=totals[:, 3],
+        percentile=percentile,
+    )
+
+
+def count_row(pool: Mapping[Dice, int]) -> Sequence[int]:
+    """
+    The pool's count of each die type, in DIE_CODES order.
+    """
+    if isinstance(pool, DiceCounts):
+        return pool.counts
+
+    return [pool.get(die_type, 0) for die_type in DIE_CODES]
+
+
+def roll_batch(
+    pools: Sequence[Mapping[Dice, int]],
+    rng: Optional[np.random.Generator] = None,
+) -> Rolls:
+    """
+    Roll each of many different pools once, in order.  The pools are packed
+    into a count matrix and every die of a type is drawn in a single call,
+    whichever pool it belongs to, so the cost grows with the total number
+    of dice rather than with the number of pools.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+
+    counts = np.array([count_row(pool) for pool in pools], dtype=np.int64).reshape(
+        -1, len(DIE_CODES)
+    )
+    n = len(counts)
+    owners = np.arange(n)
+    totals = np.zeros((n, 4), dtype=np.int32)
+    percentile_counts = np.zeros(n, dtype=np.int64)
+
+    for code, die_type in enumerate(DIE_CODES):
+        if die_type is Dice.PERCENTILE:
+            percentile_counts = counts[:, code]
+            continue
+
+        total = int(counts[:, code].sum())
+        if total == 0:
+            continue
+
+        table = outcome_table(die_type)
+        faces = rng.integers(0, len(table), size=total)
+        outcomes = table[faces]
+        # Each pool's dice of this type are consecutive draws
+        pool_of = np.repeat(owners, counts[:, code])
+        for column in range(4):
+            totals[:, column] += np.bincount(
+                pool_of, weights=outcomes[:, column], minlength=n
+            ).astype(np.int32)
+
+    width = int(percentile_counts.max(initial=0))
+    drawn = draw_percentiles(rng, (n, width))
+    percentile = np.where(
+        np.arange(width) < percentile_counts[:, np.newaxis], drawn, 0
+    ).astype(np.int16)
+
+    return Rolls(
+        success=totals[:, 0],
+        advantage=totals[:, 1],
+        triumph=totals[:, 2],
+        despair=totals[:, 3],
+        percentile=percentile,
+    )
+
+
+def wilson_interval(
+    successes: int, samples: int, confidence: float = 0.95
+) -> Tuple[float, float]:
+    """
+    Wilson score interval for a binomial proportion.
+    """
+    if samples == 0:
+        return 0.0, 1.0
+
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    p = successes / samples
+    denominator = 1 + z**2 / samples
+    centre = (p + z**2 / (2 * samples)) / denominator
+    margin = (
+        z * math.sqrt(p * (1 - p) / samples + z**2 / (4 * samples**2)) / denominator
+    )
+
+    return max(centre - margin, 0.0), min(centre + margin, 1.0)
+
+
+@dataclass
+class Estimate:
+    successes: int
+    samples: int
+    confidence: float = 0.95
+
+    @property
+    def probability(self) -> float:
+        return self.successes / self.samples if self.samples > 0 else 0.0
+
+    def interval(self) -> Tuple[float, float]:
+        return wilson_interval(self.successes, self.samples, self.confidence)
+
+    def half_width(self) -> float:
+        low, high = self.interval()
+        return (high - low) / 2
+
+    def __str__(self) -> str:
+        low, high = self.interval()
+        return (
+            f"{round(self.probability * 100, 2)}% "
+            f"({round(self.confidence * 100)}% CI {round(low * 100, 2)}%"
+            f" - {round(high * 100, 2)}%, {self.samples} samples)"
+        )
+
+
+MONTE_CARLO_BATCH_SIZE = 100_000
+MONTE_CARLO_MAX_SAMPLES = 10_000_000
+
+
+def count_successes(dice_counts: Mapping[Dice, int], n: int, seed: Any = None) -> int:
+    rolls = roll_many(dice_counts, n, np.random.default_rng(seed))
+    return int(rolls.successes.sum())
+
+
+def estimate_success_probability(
+    dice_counts: Mapping[Dice, int],
+    samples: Optional[int] = None,
+    tolerance: Optional[float] = None,
+    confidence: float = 0.95,
+    jobs: int = 1,
+    batch_size: int = MONTE_CARLO_BATCH_SIZE,
+    seed: Optional[int] = None,
+) -> Estimate:
+    """
+    Monte Carlo estimate of the success probability.  Samples are drawn in
+    batches, optionally sharded over a process pool, and drawing stops early
+    once the confidence interval is within +/- tolerance.  Given a seed,
+    the batches, and with jobs=1 the estimate, are reproducible.
+    """
+    if samples is None:
+        samples = MONTE_CARLO_MAX_SAMPLES if tolerance is not None else 1_000_000
+
+    batches = [batch_size] * (samples // batch_size)
+    if samples % batch_size > 0:
+        batches.append(samples % batch_size)
+
+    seeds = np.random.SeedSequence(seed).spawn(len(batches))
+    estimate = Estimate(0, 0, confidence)
+
+    def done() -> bool:
+        return tolerance is not None and estimate.half_width() <= tolerance
+
+    if jobs <= 1:
+        for n, batch_seed in zip(batches, seeds):
+            estimate.successes += count_successes(dice_counts, n, batch_seed)
+            estimate.samples += n
+            if done():
+                break
+        return estimate
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = {
+            executor.submit(count_successes, dice_counts, n, batch_seed): n
+            for n, batch_seed in zip(batches, seeds)
+        }
+        for future in as_completed(pending):
+            estimate.successes += future.result()
+            estimate.samples += pending[future]
+            if done():
+                for other in pending:
+                    other.cancel()
+                break
+
+    return estimate
@@ -0,0 +1,142 @@
+"""
+Search for the cheapest change to a pool's difficulty (or to its
+positive dice) that brings its success probability to a target.
+
+A pool is changed by adding dice and upgrading them: on the negative
+side, difficulty dice and upgrades to challenge plus setback dice; on
+the positive side, ability dice and upgrades to proficiency plus boost
+dice.  Each added die and each upgrade costs 1.
+
+Adding or upgrading a negative die never raises the odds, and adding or
+upgrading a positive die never lowers them, so for each number of
+upgrades and extra dice only the fewest plain dice that reach the target
+need to be found, and the search stops as soon as it can't get cheaper.
+Success probabilities come from the cached prefix histograms, which
+candidates share.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, NamedTuple, Optional
+
+from genesys_dice.dice import Dice, DicePool
+from genesys_dice.probability import success_fraction
+
+
+class Side(NamedTuple):
+    plain: Dice
+    upgraded: Dice
+    extra: Dice
+    lowers_odds: bool
+
+
+SIDES: Dict[str, Side] = {
+    "negative": Side(Dice.DIFFICULTY, Dice.CHALLENGE, Dice.SETBACK, True),
+    "positive": Side(Dice.ABILITY, Dice.PROFICIENCY, Dice.BOOST, False),
+}
+
+SOLVER_MAX_COST = 12
+"""
+Default limit on the number of dice added plus upgrades made.
+"""
+
+
+@dataclass
+class Solution:
+    pool: DicePool
+    probability: float
+    cost: int
+    added: int
+    upgrades: int
+    extra: int
+
+    def __str__(self) -> str:
+        changes = []
+        if self.added > 0:
+            changes.append(f"add {self.added}")
+        if self.upgrades > 0:
+            changes.append(f"upgrade {self.upgrades}")
+        if self.extra > 0:
+            changes.append(f"add {self.extra} extra")
+        change_str = ", ".join(changes) if changes else "no change"
+
+        return f"{self.pool.dice} ({change_str}): {round(self.probability, 2)}%"
+
+
+def solutions(
+    base: DicePool,
+    target: float,
+    side: str = "negative",
+    max_cost: int = SOLVER_MAX_COST,
+) -> List[Solution]:
+    """
+    For each number of upgrades and extra dice, the pool with the fewest
+    added plain dice whose success probability reaches target (at most
+    target on the negative side, at least target on the positive side),
+    cheapest first and then closest to target.
+    """
+    if side not in SIDES:
+        raise Exception(f"Unknown side: {side}, expected one of {list(SIDES)}")
+
+    plain, upgraded, extra, lowers_odds = SIDES[side]
+    counts = base.dice_counts
+    found: List[Solution] = []
+    best_cost: Optional[int] = None
+
+    def reaches(probability: float) -> bool:
+        return probability <= target if lowers_odds else probability >= target
+
+    for upgrades in range(max_cost + 1):
+        if best_cost is not None and upgrades > best_cost:
+            break
+
+        for extras in range(max_cost - upgrades + 1):
+            # Upgrading a plain die turns it into an upgraded one, so the
+            # plain dice available to upgrade come first
+            fewest_added = max(upgrades - counts[plain], 0)
+            if best_cost is not None and fewest_added + upgrades + extras > best_cost:
+                break
+
+            for added in range(fewest_added, max_cost - upgrades - extras + 1):
+                cost = added + upgrades + extras
+                if best_cost is not None and cost > best_cost:
+                    break
+
+                candidate = (
+                    counts.add(plain, added - upgrades)
+                    .add(upgraded, upgrades)
+                    .add(extra, extras)
+                )
+                probability = success_fraction(candidate) * 100
+
+                if reaches(probability):
+                    found.append(
+                        Solution(
+                            DicePool(candidate.roll_str()),
+                            probability,
+                            cost,
+                            added,
+                            upgrades,
+                            extras,
+                        )
+                    )
+                    if best_cost is None or cost < best_cost:
+                        best_cost = cost
+                    break
+
+    found.sort(key=lambda s: (s.cost, abs(s.probability - target)))
+
+    return found
+
+
+def solve(
+    base: DicePool,
+    target: float,
+    side: str = "negative",
+    max_cost: int = SOLVER_MAX_COST,
+) -> Optional[Solution]:
+    """
+    The cheapest pool that reaches target, or None if none does within
+    max_cost.
+    """
+    found = solutions(base, target, side, max_cost)
+    return found[0] if len(found) > 0 else None
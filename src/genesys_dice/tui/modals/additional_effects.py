@@ -5,6 +5,7 @@ from rich.padding import Padding
 from rich.panel import Panel
 from rich.text import Text
 
+from textual import work
 from textual.app import ComposeResult
 from textual.binding import Binding
 from textual.containers import Middle, Horizontal, Vertical, ItemGrid
@@ -15,15 +16,18 @@ from textual.widgets import (
     Static,
 )
 from textual.widgets.selection_list import Selection
+from textual.worker import get_current_worker
 
 from genesys_dice import data
 from genesys_dice.dice import (
     AdditionalEffects,
     AdditionalEffectOption,
     Dice,
+    DiceCounts,
     DicePool,
     Modifier,
 )
+from genesys_dice.planner import INTERACTIVE_BUDGET, success_odds
 from genesys_dice.tui.rich.dice_faces import get_dice_symbols
 
 
@@ -93,6 +97,8 @@ class AdditionalEffectsModal(ModalScreen[None]):
 
     additional_effects: AdditionalEffects
     dice_pool: DicePool
+    prompts: List[Text]
+    success_rate: Optional[float] = None
 
     def __init__(self, dice_pool: DicePool, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
@@ -100,6 +106,7 @@ class AdditionalEffectsModal(ModalScreen[None]):
         self.additional_effects = data.load_from_file(
             "roll-builders.yaml", AdditionalEffects
         )[0]
+        self.prompts = []
 
     def compose(self) -> ComposeResult:
         options = []
@@ -107,9 +114,9 @@ class AdditionalEffectsModal(ModalScreen[None]):
         for option in self.additional_effects.options:
             symbols = get_dice_symbols(option.difficulty, pad=max_difficulty_len)
             selected = option in self.dice_pool.additional_effects
-            options.append(
-                Selection(symbols + " " + option.name, option, initial_state=selected)
-            )
+            prompt = symbols + " " + option.name
+            self.prompts.append(prompt)
+            options.append(Selection(prompt, option, initial_state=selected))
 
         with ItemGrid(id="-effects-container"):
             yield Static(
@@ -126,6 +133,51 @@ class AdditionalEffectsModal(ModalScreen[None]):
                 yield Static(id="-effect-option")
                 yield Static(id="-effect-selected")
 
+    def on_mount(self) -> None:
+        self.refresh_odds()
+
+    def refresh_odds(self) -> None:
+        self.success_rate = None
+        self.update_current_dice()
+        self.compute_odds(
+            self.dice_pool.dice_counts, list(self.dice_pool.additional_effects)
+        )
+
+    @work(thread=True, exclusive=True, group="odds")
+    def compute_odds(
+        self, counts: DiceCounts, selected: List[AdditionalEffectOption]
+    ) -> None:
+        """
+        The success rate of the pool, and how much toggling each option
+        would change it, each from the planner.  Pools that differ by an
+        option share all but the last few dice of their cached histograms,
+        and a newer selection cancels this one.
+        """
+        worker = get_current_worker()
+        success_rate = success_odds(counts, budget=INTERACTIVE_BUDGET).percent
+        changes = []
+
+        for option in self.additional_effects.options:
+            if worker.is_cancelled:
+                return
+            toggled = option.apply(counts, remove=option in selected)
+            odds = success_odds(toggled, budget=INTERACTIVE_BUDGET)
+            changes.append(round(odds.percent - success_rate, 2))
+
+        if not worker.is_cancelled:
+            self.app.call_from_thread(self.show_odds, success_rate, changes)
+
+    def show_odds(self, success_rate: float, changes: List[float]) -> None:
+        self.success_rate = success_rate
+        self.update_current_dice()
+
+        selection_list = self.query_one(SelectionList)
+        for index, (prompt, change) in enumerate(zip(self.prompts, changes)):
+            change_str = f" {change:+}%" if change != 0 else ""
+            selection_list.replace_option_prompt_at_index(
+                index, prompt + Text(change_str, style="dim")
+            )
+
     def on_selection_list_selection_highlighted(
         self, event: SelectionList.SelectionHighlighted[AdditionalEffectOption]
     ) -> None:
@@ -155,9 +207,13 @@ class AdditionalEffectsModal(ModalScreen[None]):
         )
 
     def update_current_dice(self) -> None:
-        self.query_one("#-current-dice", Static).update(
-            Text("Current Dice: ") + get_dice_symbols(self.dice_pool.roll_str())
+        current_dice = Text("Current Dice: ") + get_dice_symbols(
+            self.dice_pool.roll_str()
         )
+        if self.success_rate is not None:
+            current_dice += f"  {self.success_rate}% success"
+
+        self.query_one("#-current-dice", Static).update(current_dice)
 
     def on_selection_list_selection_toggled(
         self, event: SelectionList.SelectionToggled[AdditionalEffectOption]
@@ -170,7 +226,7 @@ class AdditionalEffectsModal(ModalScreen[None]):
         else:
             self.dice_pool.remove_additional_effect(effect)
 
-        self.update_current_dice()
+        self.refresh_odds()
 
     def on_selection_list_selected_changed(
         self, event: SelectionList.SelectedChanged[AdditionalEffectOption]
@@ -21,6 +21,7 @@ from textual.widgets import (
 
 from genesys_dice import data
 from genesys_dice.dice import DicePool
+from genesys_dice.planner import INTERACTIVE_BUDGET
 from genesys_dice.tui.messages import (
     CopyCommandMessage,
     SaveRollMessage,
@@ -106,6 +107,8 @@ class Roll(Vertical, can_focus=True, can_focus_children=False):
         )
         self.dice_pool = dice_pool
         self.border_title: str = dice_pool.name
+        odds = dice_pool.success_odds(budget=INTERACTIVE_BUDGET)
+        self.border_subtitle: str = f"{odds.percent}% success"
 
     def compose(self) -> ComposeResult:
         with Center(id="-center-dice-container"):
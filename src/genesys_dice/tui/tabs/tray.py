@@ -1,4 +1,4 @@
-from typing import cast, List
+from typing import cast, List, Optional
 
 import pyperclip  # type: ignore
 
@@ -17,13 +17,17 @@ from textual.widgets import (
     Button,
     TabPane,
 )
+from textual.worker import get_current_worker
 
 from genesys_dice.dice import (
     Dice,
+    DiceCounts,
     DicePool,
     Modifier,
     Result,
 )
+from genesys_dice.planner import INTERACTIVE_BUDGET
+from genesys_dice.reroll import TALENTS, RerollOdds, reroll_odds
 from genesys_dice.tui.messages import CopyCommandMessage, SaveRollMessage
 
 from genesys_dice.tui.modals.additional_effects import AdditionalEffectsModal
@@ -36,6 +40,13 @@ from genesys_dice.tui.widgets import (
 from genesys_dice.tui.tabs.data_tab import DataTab
 
 
+def talent_label(talent: str) -> str:
+    """
+    The talent's name, marked when its dice are chosen by a heuristic.
+    """
+    return talent if TALENTS[talent].optimal else f"{talent} (heuristic)"
+
+
 class DiceMenu(TitleContainer, can_focus=True):
 
     def compose(self) -> ComposeResult:
@@ -88,10 +99,13 @@ class Tray(TabPane, DataTab[DicePool], can_focus=True):
         ("ctrl+l", "app.press_button('#Clear')", "Clear"),
         ("ctrl+o", "copy_command_text()", "Copy Command"),
         ("m", "show_additional_effects()", "Additional Effects"),
+        ("r", "cycle_talent()", "Reroll Talent"),
     ]
 
     dice_pool: reactive[DicePool] = reactive(DicePool, always_update=True)
     roll_result: reactive[Result] = reactive(Result)
+    talent: reactive[Optional[str]] = reactive(None, init=False)
+    odds_subtitle: str = ""
 
     def compose(self) -> ComposeResult:
         with ItemGrid(id="TrayUpper", min_column_width=17):
@@ -150,14 +164,73 @@ class Tray(TabPane, DataTab[DicePool], can_focus=True):
 
     def watch_dice_pool(self) -> None:
         dice_roll_str = self.dice_pool.roll_str()
-        self.query_one("#RollString", TitleButton).label = Text(
-            dice_roll_str + "\n"
-        ) + get_dice_symbols(dice_roll_str)
+        roll_string_button = self.query_one("#RollString", TitleButton)
+        roll_string_button.label = Text(dice_roll_str + "\n") + get_dice_symbols(
+            dice_roll_str
+        )
+
+        if self.dice_pool.is_empty():
+            self.odds_subtitle = ""
+        else:
+            odds = self.dice_pool.success_odds(budget=INTERACTIVE_BUDGET)
+            self.odds_subtitle = f"{odds.percent}% success ({odds.details()})"
+        self.refresh_talent_odds()
         self.query_one(Pending).border_subtitle = self.dice_pool.name
+        self.update_result_label()
+
+    def action_cycle_talent(self) -> None:
+        """
+        Compare the success rate with each of TALENTS in turn, then none.
+        """
+        names: List[Optional[str]] = [None, *TALENTS]
+        self.talent = names[(names.index(self.talent) + 1) % len(names)]
+
+    def watch_talent(self) -> None:
+        self.refresh_talent_odds()
+
+    def refresh_talent_odds(self) -> None:
+        roll_string_button = self.query_one("#RollString", TitleButton)
+        roll_string_button.border_subtitle = self.odds_subtitle
+
+        if self.talent is not None and not self.dice_pool.is_empty():
+            label = talent_label(self.talent)
+            roll_string_button.border_subtitle += f", … with {label}"
+            self.compute_talent_odds(self.dice_pool.dice_counts, self.talent)
+
+    @work(thread=True, exclusive=True, group="talent")
+    def compute_talent_odds(self, counts: DiceCounts, talent: str) -> None:
+        """
+        The pool's odds with the talent, exact and so too slow for the
+        event loop on a large pool.  A newer pool or talent cancels this.
+        """
+        worker = get_current_worker()
+        odds = reroll_odds(counts, TALENTS[talent])
+
+        if not worker.is_cancelled:
+            self.app.call_from_thread(self.show_talent_odds, talent, odds)
+
+    def show_talent_odds(self, talent: str, odds: RerollOdds) -> None:
+        percent = round(odds.success_probability * 100, 2)
+        self.query_one("#RollString", TitleButton).border_subtitle = (
+            f"{self.odds_subtitle}, {percent}% with {talent_label(talent)}"
+        )
+
+    def update_result_label(self) -> None:
+        """
+        The last roll, with the pool's expected net symbols under it.
+        """
+        label = Text(str(self.roll_result))
+        if not self.dice_pool.is_empty():
+            label.append("\n" + str(self.dice_pool.moments()), style="dim")
+        self.query_one("#RollResult", TitleButton).label = label
 
     def watch_roll_result(self, roll_result: Result) -> None:
         formatted_details = Text(roll_result.details_str(), justify="left")
-        self.query_one("#RollDetails", TitleButton).label = formatted_details
+        roll_details_button = self.query_one("#RollDetails", TitleButton)
+        roll_details_button.label = formatted_details
+        roll_details_button.border_subtitle = (
+            f"seed {roll_result.seed}" if roll_result.seed is not None else ""
+        )
 
         match roll_result.success:
             case True:
@@ -169,9 +242,9 @@ class Tray(TabPane, DataTab[DicePool], can_focus=True):
             case _:
                 raise Exception(f"Invalid result.success value: {roll_result.success}")
 
-        roll_result_button = self.query_one("#RollResult", TitleButton)
-        roll_result_button.label = str(roll_result)
+        self.update_result_label()
 
+        roll_result_button = self.query_one("#RollResult", TitleButton)
         roll_result_button.variant = variant
         roll_result_button.border_subtitle = subtitle
 
@@ -203,7 +276,7 @@ class Tray(TabPane, DataTab[DicePool], can_focus=True):
 
     @on(Button.Pressed, "#Roll")
     def roll_dice(self, message: Button.Pressed) -> None:
-        self.roll_result = self.dice_pool.roll()
+        self.roll_result = self.dice_pool.roll(record_seed=True)
 
     @on(Button.Pressed, "#Clear")
     def clear_dice(self, message: Button.Pressed) -> None:
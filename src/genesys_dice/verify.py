@@ -0,0 +1,475 @@
+"""
+Differential verification of the probability engines against a
+brute-force oracle.
+
+The oracle enumerates every combination of faces of a small pool with
+itertools.product and counts their symbols the way the original roller
+did.  Each engine in ENGINES is checked against it on randomly generated
+pools: exact engines must agree count for count, Monte Carlo and
+importance-sampling engines must contain the exact answer in their
+confidence interval, and approximations must be within their error
+bound.  The reroll engine is checked against the best choice for every
+roll, found by trying every die it could reroll.  A mismatch is shrunk,
+one die at a time, to a minimal pool that still reproduces it.
+
+A few hundred pools make a quick self-check; many thousands make a soak
+run.
+"""
+
+from dataclasses import dataclass, field
+import itertools
+import math
+import random
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from genesys_dice.approximation import approximate_success
+from genesys_dice.dice import Dice, DiceCounts, Symbol, count_symbols
+from genesys_dice.importance import importance_probability
+from genesys_dice.lookup import lookup
+from genesys_dice.planner import brute_force_success, success_odds
+from genesys_dice.probability import (
+    JointHistogram,
+    Outcome,
+    SYMBOL_DICE,
+    Tensor,
+    joint_distribution,
+    joint_prefix,
+    net_success_histogram,
+    pool_key,
+    residue_primes,
+    residue_tensor,
+    success_probability,
+)
+from genesys_dice.query import pool_query
+from genesys_dice.reroll import TALENTS, RerollPolicy, reroll_odds
+from genesys_dice.sampling import Estimate, roll_batch, roll_many
+
+ORACLE_MAX_COMBINATIONS = 10_000
+"""
+Largest pool, in face combinations, that the oracle enumerates.
+"""
+
+VERIFY_POOLS = 100
+
+MONTE_CARLO_SAMPLES = 20_000
+BATCH_SAMPLES = 5_000
+IMPORTANCE_SAMPLES = 2_000
+MONTE_CARLO_CONFIDENCE = 0.99999
+"""
+Wide enough that a correct sampler is flagged about once in 100,000
+pools.
+"""
+
+REROLL_MAX_COMBINATIONS = 2_000
+"""
+Largest pool the reroll check enumerates, since every roll is resolved
+for every talent.
+"""
+
+TOLERANCE = 1e-9
+
+Check = Callable[[DiceCounts, JointHistogram], Optional[str]]
+
+
+def brute_force(dice_counts: DiceCounts) -> JointHistogram:
+    """
+    Joint histogram of the pool's symbol dice by full enumeration.
+    """
+    faces = [die_type.faces for die_type in dice_counts.dice if die_type in SYMBOL_DICE]
+    histogram: JointHistogram = {}
+
+    for combination in itertools.product(*faces):
+        symbols = count_symbols(list(combination))
+        triumph, despair = symbols[Symbol.TRIUMPH], symbols[Symbol.DESPAIR]
+        outcome = Outcome(
+            symbols[Symbol.SUCCESS] + triumph - symbols[Symbol.FAILURE] - despair,
+            symbols[Symbol.ADVANTAGE] - symbols[Symbol.THREAT],
+            triumph,
+            despair,
+        )
+        histogram[outcome] = histogram.get(outcome, 0) + 1
+
+    return histogram
+
+
+def random_pool(
+    rng: random.Random, max_combinations: int = ORACLE_MAX_COMBINATIONS
+) -> DiceCounts:
+    """
+    A random pool of symbol dice small enough for the oracle.
+    """
+    counts = DiceCounts()
+    combinations = 1
+
+    while rng.random() > 0.15:
+        die_type = rng.choice(SYMBOL_DICE)
+        if combinations * len(die_type.faces) > max_combinations:
+            break
+        counts = counts.add(die_type)
+        combinations *= len(die_type.faces)
+
+    return counts
+
+
+def probability_of(
+    histogram: JointHistogram, condition: Callable[[Outcome], bool]
+) -> float:
+    total = sum(histogram.values())
+    return sum(count for o, count in histogram.items() if condition(o)) / total
+
+
+def mean_of(histogram: JointHistogram, value: Callable[[Outcome], int]) -> float:
+    total = sum(histogram.values())
+    return sum(value(o) * count for o, count in histogram.items()) / total
+
+
+def compare_histograms(
+    expected: Mapping[Any, int], actual: Mapping[Any, int]
+) -> Optional[str]:
+    if expected == actual:
+        return None
+
+    different = sorted(
+        key
+        for key in expected.keys() | actual.keys()
+        if expected.get(key) != actual.get(key)
+    )
+    key = different[0]
+    return (
+        f"{len(different)} values differ, e.g. {key}: "
+        f"expected {expected.get(key, 0)}, got {actual.get(key, 0)}"
+    )
+
+
+def compare_values(name: str, expected: float, actual: float) -> Optional[str]:
+    if abs(expected - actual) <= TOLERANCE:
+        return None
+
+    return f"{name}: expected {expected}, got {actual}"
+
+
+def check_net_success(counts: DiceCounts, oracle: JointHistogram) -> Optional[str]:
+    expected: Dict[int, int] = {}
+    for outcome, count in oracle.items():
+        expected[outcome.success] = expected.get(outcome.success, 0) + count
+
+    return compare_histograms(expected, net_success_histogram(counts))
+
+
+def check_joint(counts: DiceCounts, oracle: JointHistogram) -> Optional[str]:
+    return compare_histograms(oracle, joint_prefix(pool_key(counts)))
+
+
+def check_tensor(counts: DiceCounts, oracle: JointHistogram) -> Optional[str]:
+    return compare_histograms(oracle, residue_tensor(pool_key(counts)).histogram())
+
+
+def check_residues(counts: DiceCounts, oracle: JointHistogram) -> Optional[str]:
+    primes = residue_primes(2)
+    residues = [residue_tensor(pool_key(counts), prime) for prime in primes]
+
+    return compare_histograms(
+        oracle, Tensor.from_residues(residues, primes).histogram()
+    )
+
+
+def check_distribution(counts: DiceCounts, oracle: JointHistogram) -> Optional[str]:
+    distribution = joint_distribution(counts)
+    if distribution.total != sum(oracle.values()):
+        return f"total: expected {sum(oracle.values())}, got {distribution.total}"
+
+    return compare_histograms(oracle, distribution.counts)
+
+
+def check_success_probability(
+    counts: DiceCounts, oracle: JointHistogram
+) -> Optional[str]:
+    expected = round(probability_of(oracle, lambda o: o.success > 0) * 100, 2)
+    return compare_values("success %", expected, success_probability(counts))
+
+
+def check_query(counts: DiceCounts, oracle: JointHistogram) -> Optional[str]:
+    query = pool_query(counts)
+
+    return compare_values(
+        "P(success > 0 and advantage > 0)",
+        probability_of(oracle, lambda o: o.success > 0 and o.advantage > 0),
+        query.probability("success > 0 and advantage > 0"),
+    ) or compare_values(
+        "E[advantage]",
+        mean_of(oracle, lambda o: o.advantage),
+        query.expectation("advantage"),
+    )
+
+
+def check_lookup(counts: DiceCounts, oracle: JointHistogram) -> Optional[str]:
+    record = lookup(counts)
+    if record is None:
+        return None
+
+    expected = {
+        "success": probability_of(oracle, lambda o: o.success > 0),
+        "net_success": mean_of(oracle, lambda o: o.success),
+        "net_advantage": mean_of(oracle, lambda o: o.advantage),
+        "advantage": probability_of(oracle, lambda o: o.advantage > 0),
+        "triumph": probability_of(oracle, lambda o: o.triumph > 0),
+        "despair": probability_of(oracle, lambda o: o.despair > 0),
+    }
+
+    for name, value in expected.items():
+        mismatch = compare_values(name, value, getattr(record, name))
+        if mismatch is not None:
+            return mismatch
+
+    return None
+
+
+def compare_estimate(
+    successes: int, samples: int, oracle: JointHistogram
+) -> Optional[str]:
+    estimate = Estimate(successes, samples, MONTE_CARLO_CONFIDENCE)
+    expected = probability_of(oracle, lambda o: o.success > 0)
+    low, high = estimate.interval()
+
+    if low <= expected <= high:
+        return None
+
+    return f"success %: expected {round(expected * 100, 2)}, got {estimate}"
+
+
+def check_monte_carlo(counts: DiceCounts, oracle: JointHistogram) -> Optional[str]:
+    # Seeded by the pool, so that a mismatch reproduces
+    rolls = roll_many(counts, MONTE_CARLO_SAMPLES, np.random.default_rng(counts.key))
+    return compare_estimate(int(rolls.successes.sum()), len(rolls), oracle)
+
+
+def check_batch(counts: DiceCounts, oracle: JointHistogram) -> Optional[str]:
+    # One pool per row, so fewer rolls than the other samplers
+    pools = [counts] * BATCH_SAMPLES
+    rolls = roll_batch(pools, np.random.default_rng(counts.key))
+    return compare_estimate(int(rolls.successes.sum()), len(rolls), oracle)
+
+
+def check_importance(counts: DiceCounts, oracle: JointHistogram) -> Optional[str]:
+    condition = "success > 0 and advantage >= 2"
+    estimate = importance_probability(
+        counts, condition, samples=IMPORTANCE_SAMPLES, seed=counts.key
+    )
+    expected = probability_of(oracle, lambda o: o.success > 0 and o.advantage >= 2)
+    low, high = estimate.interval(MONTE_CARLO_CONFIDENCE)
+
+    if low - TOLERANCE <= expected <= high + TOLERANCE:
+        return None
+
+    return f"P({condition}): expected {expected}, got {estimate}"
+
+
+def check_approximation(method: str) -> Check:
+    def check(counts: DiceCounts, oracle: JointHistogram) -> Optional[str]:
+        approximation = approximate_success(counts, method)
+        expected = probability_of(oracle, lambda o: o.success > 0)
+
+        if abs(approximation.probability - expected) <= approximation.error_bound:
+            return None
+
+        return f"success %: expected {round(expected * 100, 2)}, got {approximation}"
+
+    return check
+
+
+def check_brute_force(counts: DiceCounts, oracle: JointHistogram) -> Optional[str]:
+    return compare_values(
+        "P(success > 0)",
+        probability_of(oracle, lambda o: o.success > 0),
+        brute_force_success(counts),
+    )
+
+
+def check_planner(counts: DiceCounts, oracle: JointHistogram) -> Optional[str]:
+    answer = success_odds(counts)
+    expected = probability_of(oracle, lambda o: o.success > 0)
+
+    if abs(answer.probability - expected) <= answer.error + TOLERANCE:
+        return None
+
+    return f"success %: expected {round(expected * 100, 2)}, got {answer}"
+
+
+def brute_force_reroll(counts: DiceCounts, policy: RerollPolicy) -> float:
+    """
+    Chance of success when the chooser makes the best choice for every
+    roll, found by trying every set of up to policy.dice eligible dice
+    and every face they could be rerolled to.
+    """
+    dice = [die_type for die_type in counts.dice if die_type in SYMBOL_DICE]
+    tables = [[v.net_success for v in die_type.table] for die_type in dice]
+    sign = 1 if policy.objective == "player" else -1
+    total = 0.0
+    # Many choices keep the same net success and reroll the same die types
+    succeeds: Dict[Tuple[int, Tuple[Dice, ...]], float] = {}
+
+    for roll in itertools.product(*tables):
+        eligible = [i for i, die_type in enumerate(dice) if policy.eligible(die_type)]
+        best: Optional[float] = None
+
+        for j in range(min(policy.dice, len(eligible)) + 1):
+            for chosen in itertools.combinations(eligible, j):
+                kept = sum(roll) - sum(roll[i] for i in chosen)
+                rerolled = () if policy.remove else tuple(dice[i] for i in chosen)
+                if (kept, rerolled) not in succeeds:
+                    fresh = list(
+                        itertools.product(*(tables[dice.index(d)] for d in rerolled))
+                    )
+                    succeeds[(kept, rerolled)] = sum(
+                        1 for faces in fresh if kept + sum(faces) > 0
+                    ) / len(fresh)
+                chance = succeeds[(kept, rerolled)]
+                if best is None or sign * chance > sign * best:
+                    best = chance
+
+        total += best or 0.0
+
+    return total / math.prod(len(table) for table in tables)
+
+
+def check_reroll(counts: DiceCounts, oracle: JointHistogram) -> Optional[str]:
+    combinations = math.prod(
+        len(die_type.faces) for die_type in counts.dice if die_type in SYMBOL_DICE
+    )
+    if combinations > REROLL_MAX_COMBINATIONS:
+        return None
+
+    # Without a talent, the odds are the oracle's
+    total = sum(oracle.values())
+    unchanged: Dict[Tuple[int, int], float] = {}
+    for outcome, count in oracle.items():
+        key = (outcome.success, outcome.advantage)
+        unchanged[key] = unchanged.get(key, 0.0) + count / total
+
+    actual = reroll_odds(counts, RerollPolicy(0)).joint
+    for key in unchanged.keys() | actual.keys():
+        mismatch = compare_values(
+            f"no talent: P{key}", unchanged.get(key, 0.0), actual.get(key, 0.0)
+        )
+        if mismatch is not None:
+            return mismatch
+
+    # The best choice is matched exactly; a heuristic can only do worse
+    for policy in TALENTS.values():
+        best = brute_force_reroll(counts, policy)
+        odds = reroll_odds(counts, policy)
+        got = odds.success_probability
+        if policy.optimal:
+            mismatch = compare_values(f"{policy}: success", best, got)
+            if mismatch is not None:
+                return mismatch
+        elif (got - best) * policy.sign > TOLERANCE:
+            return f"{policy}: success beats the best choice, {best} < {got}"
+        if abs(sum(odds.joint.values()) - 1) > TOLERANCE:
+            return f"{policy}: odds sum to {sum(odds.joint.values())}"
+
+    return None
+
+
+ENGINES: Dict[str, Check] = {
+    "net-success": check_net_success,
+    "joint": check_joint,
+    "tensor": check_tensor,
+    "residues": check_residues,
+    "distribution": check_distribution,
+    "success-probability": check_success_probability,
+    "query": check_query,
+    "lookup": check_lookup,
+    "monte-carlo": check_monte_carlo,
+    "batch": check_batch,
+    "importance": check_importance,
+    "normal": check_approximation("normal"),
+    "saddlepoint": check_approximation("saddlepoint"),
+    "brute-force": check_brute_force,
+    "planner": check_planner,
+    "reroll": check_reroll,
+}
+
+
+def shrink(check: Check, counts: DiceCounts) -> DiceCounts:
+    """
+    Remove dice one at a time for as long as the check still fails.
+    """
+    shrinking = True
+
+    while shrinking:
+        shrinking = False
+        for die_type, _ in counts.nonzero():
+            smaller = counts.add(die_type, -1)
+            if check(smaller, brute_force(smaller)) is not None:
+                counts = smaller
+                shrinking = True
+                break
+
+    return counts
+
+
+@dataclass
+class Mismatch:
+    engine: str
+    pool: DiceCounts
+    message: str
+    minimal: DiceCounts
+
+    def __str__(self) -> str:
+        return (
+            f"{self.engine}: {self.pool.roll_str() or '(empty)'}: {self.message}"
+            f" (minimal pool: {self.minimal.roll_str() or '(empty)'})"
+        )
+
+
+@dataclass
+class Verification:
+    pools: int = 0
+    checks: int = 0
+    mismatches: List[Mismatch] = field(default_factory=list)
+
+    def __str__(self) -> str:
+        return (
+            f"Checked {self.pools} pools, {self.checks} engine checks:"
+            f" {len(self.mismatches)} mismatches"
+        )
+
+
+def verify(
+    pools: int = VERIFY_POOLS,
+    seed: Optional[int] = None,
+    engines: Optional[Sequence[str]] = None,
+    on_mismatch: Optional[Callable[[Mismatch], None]] = None,
+) -> Verification:
+    """
+    Check the engines (all of ENGINES by default) against the oracle on
+    that many random pools.  The pools are reproducible given a seed.
+    """
+    names = list(engines) if engines is not None else list(ENGINES)
+    unknown = [name for name in names if name not in ENGINES]
+    if len(unknown) > 0:
+        raise Exception(f"Unknown engines {unknown}, expected some of {list(ENGINES)}")
+
+    rng = random.Random(seed)
+    verification = Verification()
+
+    for _ in range(pools):
+        counts = random_pool(rng)
+        oracle = brute_force(counts)
+        verification.pools += 1
+
+        for name in names:
+            check = ENGINES[name]
+            message = check(counts, oracle)
+            verification.checks += 1
+
+            if message is not None:
+                mismatch = Mismatch(name, counts, message, shrink(check, counts))
+                verification.mismatches.append(mismatch)
+                if on_mismatch is not None:
+                    on_mismatch(mismatch)
+
+    return verification